@@ -1,19 +1,25 @@
 # app.py
 import streamlit as st
-from config import get_target_url, DEFAULT_BROWSER
-from llm_engine import chat_with_llm, set_llm_mode, initialize_local_model
+from config import get_target_url, DEFAULT_BROWSER, SCRAPE_CONCURRENCY, DOM_PATCH_MAX_CHANGES, MODEL_HOST_ENABLED, MODEL_PRELOAD, LOCAL_PRECISION, LOCAL_PRECISION_MODES
+from llm_engine import stream_chat_with_llm, set_llm_mode, initialize_local_model, preload_local_model, use_model_host, get_model_host_status, get_local_model_stats, get_active_model_name
 from memory_manager import MemoryManager
 from code_generator import generate_test_code, generate_multiple_tests
-from dom_scraper import suggest_validations_smart,suggest_validations
+from dom_scraper import suggest_validations_smart,scrape_pages_concurrently
+from driver_pool import get_all_pool_stats, get_driver_pool
 from intent_cache import IntentCache
+from llm_telemetry import LLMTelemetry
+from dom_cache import DomSnapshotCache
+from dom_diff import diff_snapshots, patch_page_object, summarize_diff
+from element_ranker import rank_elements
+from prompt_packer import pack_prompt, fit_max_new_tokens, estimate_reply_tokens
 from executor import execute_tests_live
 from tinydb import TinyDB
 from doc_ingestor import ingest_doc
-from rag_search import retrieve_context
+from rag_search import retrieve_context, rag_index
+from index_registry import index_registry
 import os
 import json
 from datetime import datetime
-import re
 import time
 import subprocess
 import hashlib
@@ -32,6 +38,12 @@ INTENT_PATH_MAP = {
     "dashboard":"/dashboard"
 }
 
+# Pages that render their controls server-side can skip headless Chrome (see static_scraper.py).
+# Anything not listed here is scraped with Selenium. Only mark a page "static" after a clean
+# `python static_scraper.py <page url>` live parity run: the static path falls back to Selenium
+# on redirects and empty pages, but a partial server-rendered shell would go unnoticed.
+PAGE_SCRAPE_MODES = {}
+
 def extract_pages_from_prompt(prompt: str) -> list[str]:
     prompt_lower = prompt.lower()
     matched_pages = []
@@ -44,33 +56,6 @@ def extract_pages_from_prompt(prompt: str) -> list[str]:
     matched_pages.sort(key=lambda x: 0 if x[0] == "login" else 1)
     return [p[1] for p in matched_pages]
 
-def sanitize_field_name(name):
-    name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
-    if name[0].isdigit():
-        name = f"el_{name}"
-    return name
-
-def to_findby_line(el):
-    by = el["by"]
-    selector = el["selector"]
-    field_name = sanitize_field_name(el["name"])
-    comment = f'// Type: {el["type"]}, Original name: {el["name"]}'
-
-    warning = ""
-    # Warn about numeric-only or UUID-like unstable IDs
-    if by == "id" and (selector.isdigit() or re.match(r"^[\da-f]{8}-[\da-f]{4}-[\da-f]{4}-[\da-f]{4}-[\da-f]{12}$", selector)):
-        warning = "// ⚠️ Warning: Detected unstable or auto-generated ID\n"
-
-    if by == "id":
-        return f'{warning}{comment}\n@FindBy(id = "{selector}")\nprivate WebElement {field_name};'
-    elif by == "name":
-        return f'{warning}{comment}\n@FindBy(name = "{selector}")\nprivate WebElement {field_name};'
-    elif by == "css":
-        return f'{warning}{comment}\n@FindBy(css = "{selector}")\nprivate WebElement {field_name};'
-    elif by == "xpath":
-        return f'{warning}{comment}\n@FindBy(xpath = "{selector}")\nprivate WebElement {field_name};'
-    return f'// ❌ Unsupported selector type: {by} for {el["name"]}'
-
 def infer_path_from_prompt(prompt: str):
     prompt_lower = prompt.lower()
     for keyword, path in INTENT_PATH_MAP.items():
@@ -88,9 +73,11 @@ required_session_keys = {
     "llm_response_time": "",
     "local_model_loaded_once": False,
     "last_loaded_model": "",
+    "last_loaded_precision": "",
     "llm_choice": "local",
     "memory_exported": False,
-    "local_model_name": "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+    "local_model_name": "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+    "local_precision": LOCAL_PRECISION
     }
 
 for key, default in required_session_keys.items():
@@ -106,12 +93,18 @@ if not st.session_state.initialized:
     os.makedirs("cache", exist_ok=True)
     os.makedirs("rag_versions", exist_ok=True)
 
+    if MODEL_PRELOAD and not MODEL_HOST_ENABLED:
+        # Start loading while the rest of the page builds; the sidebar load below waits on the same load
+        preload_local_model(st.session_state.local_model_name, st.session_state.local_precision)
+
     st.session_state.initialized = True
     
 
 # ✅ Step 3: Now continue app logic
 memory = MemoryManager()
 cache = IntentCache()
+dom_cache = DomSnapshotCache()
+llm_telemetry = LLMTelemetry()
 
 def clear_session_memory(full: bool = False):
     """Clear chat history or full memory depending on the flag."""
@@ -151,16 +144,38 @@ with st.sidebar:
             "mistralai/Mistral-7B-Instruct-v0.2",            
             "google/gemma-2b",
         ], key="local_model_name")
+        st.selectbox("Precision", LOCAL_PRECISION_MODES, key="local_precision",
+                     help="bfloat16 halves RAM; int8 quantizes Linear layers (~4x smaller, fastest on CPU)")
 
     local_model_name = st.session_state.local_model_name
-
-    if (not st.session_state.local_model_loaded_once) or (st.session_state.last_loaded_model != local_model_name):
-        with st.spinner(f"🧠 Loading model: {local_model_name}... please wait"):
-            success = initialize_local_model(local_model_name)
+    local_precision = st.session_state.local_precision
+    model_changed = (st.session_state.last_loaded_model != local_model_name) or (st.session_state.last_loaded_precision != local_precision)
+
+    if MODEL_HOST_ENABLED:
+        # The model lives in the shared model_host process and loads there in the background,
+        # so new sessions and UI restarts don't wait for it.
+        if llm_choice == "local" and ((not st.session_state.local_model_loaded_once) or model_changed):
+            if use_model_host(local_model_name, local_precision):
+                st.session_state.last_loaded_model = local_model_name
+                st.session_state.last_loaded_precision = local_precision
+                st.session_state.local_model_loaded_once = True
+            else:
+                st.error(f"❌ Model host unavailable for: {local_model_name}")
+        if llm_choice == "local":
+            host_status = get_model_host_status()
+            st.caption(f"🧠 Model host: {host_status.get('model')} ({host_status.get('precision')}) — {host_status.get('state')}")
+            model_stats = host_status.get("model_stats")
+            if model_stats:
+                st.caption(f"📏 {model_stats.get('size_mb')} MB · loaded in {model_stats.get('load_seconds')} sec · {model_stats.get('warmup_ms_per_token')} ms/token")
+    elif (not st.session_state.local_model_loaded_once) or model_changed:
+        with st.spinner(f"🧠 Loading model: {local_model_name} ({local_precision})... please wait"):
+            success = initialize_local_model(local_model_name, local_precision)
         if success:
             st.session_state.last_loaded_model = local_model_name
+            st.session_state.last_loaded_precision = local_precision
             st.session_state.local_model_loaded_once = True
-            st.toast(f"✅ Loaded model: {local_model_name}", icon="🧠")
+            model_stats = get_local_model_stats()
+            st.toast(f"✅ Loaded model: {local_model_name} ({local_precision}) — {model_stats.get('size_mb')} MB, ready in {model_stats.get('switch_seconds')} sec", icon="🧠")
         else:
             st.error(f"❌ Failed to load model: {local_model_name}")
     # else:
@@ -170,6 +185,8 @@ with st.sidebar:
         st.session_state.llm_choice = llm_choice
         if llm_choice == "openai":
             set_llm_mode(llm_choice)
+        elif MODEL_HOST_ENABLED:
+            use_model_host(local_model_name, local_precision)
 
     st.markdown("---")
     st.subheader("🧹 Memory Controls")
@@ -204,22 +221,33 @@ with st.sidebar:
     doc_url = st.text_input("Or Enter Help Page URL")
 
     if st.button("📅 Ingest Help Docs"):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        index_path = f"rag_versions/rag_{timestamp}"
+        # ingest_doc builds a new index version and publishes it atomically (see index_registry)
+        ingest_progress = st.empty()
+        show_progress = lambda p: ingest_progress.caption(f"🧮 {p['chunks_embedded']} chunks embedded · {p['chunks_per_sec']} chunks/sec")
         if uploaded_file:
             with open("cache/uploaded_help.pdf", "wb") as f:
                 f.write(uploaded_file.getbuffer())
-            msg = ingest_doc("cache/uploaded_help.pdf", is_url=False)
-            if os.path.exists("rag_index"):
-                os.rename("rag_index", index_path)
-            st.success(f"{msg} ✅ Snapshot saved at `{index_path}`")
+            st.success(ingest_doc("cache/uploaded_help.pdf", is_url=False, on_progress=show_progress, source_key=uploaded_file.name))
         elif doc_url:
-            msg = ingest_doc(doc_url, is_url=True)
-            if os.path.exists("rag_index"):
-                os.rename("rag_index", index_path)
-            st.success(f"{msg} ✅ Snapshot saved at `{index_path}`")
+            st.success(ingest_doc(doc_url, is_url=True, on_progress=show_progress))
         else:
             st.warning("Please upload a PDF or enter a URL.")
+        rag_index.reload()  # pick up the new index on the next retrieval instead of after the check interval
+
+    with st.expander("📚 Help Doc Index Versions"):
+        index_versions = index_registry.list_versions()
+        if index_versions:
+            st.json(index_versions)
+            rollback_to = st.selectbox("Roll back to", [m["version"] for m in index_versions if not m["current"]])
+            if rollback_to and st.button("⏪ Roll Back Index"):
+                index_registry.rollback(rollback_to)
+                rag_index.reload()
+                st.success(f"✅ Current index is now `{rollback_to}`")
+        else:
+            st.caption("No index versions yet.")
+
+    if st.button("🧹 Clear DOM Snapshot Cache"):
+        st.success(dom_cache.clear_cache())
 
     if st.button("🧹 Clear Intent Cache"):
         last_model = st.session_state.get("last_loaded_model")
@@ -229,15 +257,31 @@ with st.sidebar:
         st.session_state.last_loaded_model = last_model
         st.session_state.local_model_loaded_once = model_loaded_flag
 
+    with st.expander("🧰 Browser Pool Stats"):
+        st.json(get_all_pool_stats())
+
+    with st.expander("🧠 Loaded Models"):
+        if MODEL_HOST_ENABLED:
+            st.json((get_model_host_status().get("model_stats") or {}).get("registry", {}))
+        else:
+            st.json(get_local_model_stats().get("registry", {}))
+
+    with st.expander("📈 LLM Telemetry (p50/p95 by model)"):
+        st.json(llm_telemetry.summary())
+        if st.button("🧹 Clear LLM Telemetry"):
+            st.success(llm_telemetry.clear())
+
 # Final fallback: ensure LLM mode applied if not done earlier
 if st.session_state.get("llm_choice") and not st.session_state.get("_llm_set_once"):
     if st.session_state.llm_choice == "openai":
         set_llm_mode("openai")
     elif st.session_state.llm_choice == "local":
         default_model = st.session_state.get("last_loaded_model", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
-        if not st.session_state.get("local_model_loaded_once"):
+        if MODEL_HOST_ENABLED:
+            use_model_host(default_model or "TinyLlama/TinyLlama-1.1B-Chat-v1.0", st.session_state.get("local_precision", LOCAL_PRECISION))
+        elif not st.session_state.get("local_model_loaded_once"):
             with st.spinner(f"🧠 Auto-loading default model: {default_model}"):
-                success = initialize_local_model(default_model)
+                success = initialize_local_model(default_model, st.session_state.get("local_precision", LOCAL_PRECISION))
             if success:
                 st.session_state.last_loaded_model = default_model
                 st.session_state.local_model_loaded_once = True
@@ -278,55 +322,93 @@ if send_clicked and user_input.strip():
 
         dom_elements = []
         url = base_url  # Default in case no navigation
-
-        for i, rel_path in enumerate(navigation_paths):
-            url = f"{base_url.rstrip('/')}/{rel_path.lstrip('/')}" if rel_path else base_url
-            print(f"🔗 Scraping page: {url}")
-
-            logged_in_driver = None  # 🔐 Safe init
-
+        page_urls = [f"{base_url.rstrip('/')}/{rel_path.lstrip('/')}" if rel_path else base_url for rel_path in navigation_paths]
+        page_labels = dict(zip(page_urls, navigation_paths))
+        env_choice = st.session_state.get("env_choice", "stage")
+        auth_mode = "cookies" if use_cookies else ("credentials" if username and password else "anonymous")
+        session_cookies = None
+
+        # Reuse unchanged pages from the DOM snapshot cache before launching any browser
+        page_results = {page_url: dom_cache.get(env_choice, page_url, auth_mode) for page_url in page_urls}
+        page_errors = {}
+        pending = [page_url for page_url in page_urls if page_results[page_url] is None]
+        previous_snapshots = {page_url: dom_cache.peek(env_choice, page_url, auth_mode) for page_url in pending}
+
+        # Login (if requested) runs first so the remaining pages can reuse its session
+        if pending and page_urls and "login" in page_urls[0].lower():
+            login_url = page_urls[0]
+            print(f"🔗 Scraping page: {login_url}")
+            scrape_start = time.time()
             try:
-                if i == 0 and "login" in rel_path.lower():
-                    login_results, logged_in_driver = suggest_validations_smart(
-                        url=url,
-                        username=username,
-                        password=password,
-                        use_cookies=use_cookies,
-                        return_driver=True
-                    )
-                    dom_elements += login_results
-                    st.success("✅ Logged in and scraped login page.")
-                else:
-                    dom_elements += suggest_validations(url, driver=logged_in_driver)
-                    st.success(f"✅ Scraped: {rel_path or url}")
-
+                login_results, logged_in_driver = suggest_validations_smart(
+                    url=login_url,
+                    username=username,
+                    password=password,
+                    use_cookies=use_cookies,
+                    return_driver=True
+                )
+                page_results[login_url] = login_results
+                dom_cache.store(env_choice, login_url, auth_mode, login_results, time.time() - scrape_start)
+                if logged_in_driver is not None:
+                    session_cookies = logged_in_driver.get_cookies()
+                    get_driver_pool().release(logged_in_driver)
             except Exception as e:
-                st.error(f"❌ Failed scraping {rel_path or url}: {str(e)}")
-
-        # Step 2: Compact DOM Formatting
-        from dom_scraper import format_dom_compact
-        compact_dom = format_dom_compact(dom_elements)
+                page_errors[login_url] = e
+            pending = [page_url for page_url in pending if page_url != login_url]
+
+        # Remaining pages are scraped in parallel and merged back in INTENT_PATH_MAP order
+        if pending:
+            print(f"🔗 Scraping {len(pending)} page(s) with concurrency {SCRAPE_CONCURRENCY}: {pending}")
+            static_paths = {INTENT_PATH_MAP[k] for k, mode in PAGE_SCRAPE_MODES.items() if mode == "static"}
+            static_urls = {page_url for page_url in pending if page_labels[page_url] in static_paths}
+            outcomes = scrape_pages_concurrently(pending, cookies=session_cookies, max_workers=SCRAPE_CONCURRENCY, static_urls=static_urls)
+            for page_url, results, error, elapsed in outcomes:
+                if error:
+                    page_errors[page_url] = error
+                else:
+                    page_results[page_url] = results
+                    dom_cache.store(env_choice, page_url, auth_mode, results, elapsed)
+
+        for page_url in page_urls:
+            url = page_url
+            label = page_labels[page_url] or page_url
+            if page_url in page_errors:
+                st.error(f"❌ Failed scraping {label}: {str(page_errors[page_url])}")
+            elif page_results.get(page_url) is not None:
+                dom_elements += page_results[page_url]
+                st.success(f"✅ Scraped: {label}")
+
+        cache_stats = dom_cache.get_stats()
+        st.info(f"🗂️ DOM snapshot cache — Hits: {cache_stats['hits']}, Misses: {cache_stats['misses']}, Time saved: {cache_stats['time_saved_sec']} sec")
+
+        # Step 1.5: If this prompt was already generated in this session and only a few locators
+        # changed since the last scrape, patch the previous Page Object instead of re-prompting.
+        patched_response = None
+        previous_spec = next((m for m in reversed(st.session_state.multi_module_specs) if m["user_prompt"] == prompt), None)
+        rescraped = [page_url for page_url in previous_snapshots if page_url in page_results and page_url not in page_errors]
+        if previous_spec and rescraped and all(previous_snapshots[page_url] for page_url in rescraped):
+            dom_diff = {"added": [], "removed": [], "changed": [], "unchanged": 0}
+            for page_url in rescraped:
+                page_diff = diff_snapshots(previous_snapshots[page_url], page_results[page_url])
+                for key in ("added", "removed", "changed"):
+                    dom_diff[key] += page_diff[key]
+                dom_diff["unchanged"] += page_diff["unchanged"]
+            change_count = len(dom_diff["added"]) + len(dom_diff["removed"]) + len(dom_diff["changed"])
+            if change_count <= DOM_PATCH_MAX_CHANGES:
+                patched, unresolved = patch_page_object(previous_spec["llm_code"], dom_diff)
+                if not unresolved:
+                    patched_response = patched
+                    with st.expander(f"🧬 DOM changes since last scrape ({change_count})", expanded=False):
+                        st.text(summarize_diff(dom_diff))
+
+        # Step 1.75: Keep prompt size bounded on link-heavy pages
+        dom_elements, dropped_elements = rank_elements(dom_elements, prompt)
+        if dropped_elements:
+            st.info(f"🎯 Using {len(dom_elements)} most relevant elements ({len(dropped_elements)} low-relevance links/buttons left out of the prompt)")
 
         messages = []
 
-        # System message with compact DOM instructions
-        messages.append({
-            "role": "system",
-            "content": f"""
-            Use *only* the following DOM elements extracted from {url}.
-            Each line is in the format:
-                field_name | strategy=selector
-
-            Do NOT invent new selectors or field names.
-
-            {compact_dom}
-
-            Generate a Java Page Object class using Selenium + TestNG + Maven.
-            Use @FindBy annotations and the PageFactory pattern.
-            """.strip()
-        })
-
-        # Step 2.5: RAG Help Filtering
+        # Step 2: RAG Help Filtering
         def filter_rag_chunks_by_prompt(rag_text, prompt, min_relevance=0.3):
             from difflib import SequenceMatcher
             return "\n".join(
@@ -334,37 +416,36 @@ if send_clicked and user_input.strip():
                 if SequenceMatcher(None, line.lower(), prompt.lower()).ratio() > min_relevance
             )
 
+        rag_lines = []
         rag_context = retrieve_context(prompt)
         if rag_context:
             filtered_rag = filter_rag_chunks_by_prompt(rag_context, prompt)
             if filtered_rag.strip():
-                messages.append({
-                    "role": "system",
-                    "content": f"📄 Use this filtered help documentation for better understanding:\n\n{filtered_rag}"
-                })
+                rag_lines = filtered_rag.splitlines()
                 st.info("📚 Filtered help doc context injected.")
             else:
                 st.warning("⚠️ No relevant help lines found after filtering.")
         else:
             st.warning("ℹ️ No help documentation retrieved.")
 
-        # Step 3: Combine DOM + Prompt
-        if dom_elements:
-            dom_context_lines = [to_findby_line(el) for el in dom_elements]
-            dom_context = "\n".join(dom_context_lines)
-            combined_prompt = f"""
-            Here are the DOM elements extracted from {url}. Use *only* these. Do NOT guess or invent any selectors, IDs, or field names.
-
-            {dom_context}
-
-            Now based on this, {prompt}
-            """
+        # Step 3: Pack DOM (once, compact) + help docs + prompt into the model's context window
+        # The prompt is trimmed until it and the reply estimated for the elements it keeps both fit,
+        # so the reply never gets less than DEFAULT_MAX_NEW_TOKENS.
+        active_model = get_active_model_name()
+        combined_prompt, pack_report = pack_prompt(prompt, url, dom_elements, rag_lines, model_name=active_model,
+                                                   reply_tokens=estimate_reply_tokens)
+        max_new_tokens = fit_max_new_tokens(active_model, pack_report["tokens"], estimate_reply_tokens(pack_report["dom_kept"]))
+        if pack_report["dom_dropped"] or pack_report["rag_lines_dropped"]:
+            st.warning(
+                f"📐 Prompt trimmed to {pack_report['tokens']}/{pack_report['budget']} tokens: dropped {pack_report['rag_lines_dropped']} help lines "
+                f"and {len(pack_report['dom_dropped'])} elements ({pack_report['dropped_form_controls']} form controls)"
+            )
+            with st.expander("📐 Left out of the prompt", expanded=False):
+                st.write(pack_report["dom_dropped"])
         else:
-            combined_prompt = f"""
-            No DOM elements could be extracted from {url}, so you may have to make assumptions.
-
-            {prompt}
-            """
+            st.caption(f"📐 Prompt size: {pack_report['tokens']}/{pack_report['budget']} tokens, reply up to {max_new_tokens} tokens")
+        if pack_report["over_budget"]:
+            st.error("❌ The prompt still exceeds the model's context window; consider a model with a longer context.")
 
         messages.append({"role": "user", "content": combined_prompt})
         st.session_state.chat_history = messages
@@ -381,22 +462,42 @@ if send_clicked and user_input.strip():
             st.success("✅ Retrieved code from intent cache (LLM not called).")
             response = cached_code
             elapsed = "0.0"
+        elif patched_response is not None:
+            st.success("✅ Patched the previous Page Object from the DOM diff (LLM not called).")
+            response = patched_response
+            elapsed = "0.0"
+            cache.store(cache_key, response)
+            with st.expander("🧠 Patched Response", expanded=True):
+                st.code(response, language="java")
         else:
-            response, elapsed, token_usage = chat_with_llm(messages, return_usage=True)
+            # Render tokens as they arrive instead of waiting for the whole class
+            stream_stats = {}
+            with st.expander("🧠 LLM Response", expanded=True):
+                response_box = st.empty()
+                streamed = ""
+                for chunk in stream_chat_with_llm(messages, stats=stream_stats, max_new_tokens=max_new_tokens):
+                    streamed += chunk
+                    response_box.code(streamed, language="java")
+                response = stream_stats["response"]
+                response_box.code(response, language="java")
+
+            elapsed = stream_stats["elapsed_time"]
+            token_usage = stream_stats["usage"]
             cache.store(cache_key, response)
             messages.append({"role": "assistant", "content": response})
             st.session_state.chat_history = messages
             st.session_state.llm_response_time = f"{elapsed} sec"
             st.success(f"✅ LLM responded in {elapsed} sec")
 
-            with st.expander("🧠 LLM Response", expanded=True):
-                st.code(response, language="java")
-
             # Token diagnostics
             prompt_tokens = token_usage.get("prompt_tokens", "?")
             completion_tokens = token_usage.get("completion_tokens", "?")
             total_tokens = token_usage.get("total_tokens", "?")
             st.info(f"📊 Token usage — Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens}")
+            if token_usage.get("ttft") is not None:
+                prefill = f" · prefilled {token_usage['prefill_tokens']} tokens ({token_usage['cached_prefix_tokens']} cached)" if "prefill_tokens" in token_usage else ""
+                stopped = " · stopped once both classes were complete" if token_usage.get("stopped_early") else ""
+                st.caption(f"⚡ First token after {token_usage['ttft']} sec · {token_usage.get('tokens_per_sec', 0)} tokens/sec{prefill}{stopped}")
 
         # ✅ Finalize state
         st.session_state.generated_code_ready = True
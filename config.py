@@ -1,10 +1,119 @@
 # config.py
+import os
+from urllib.parse import urlparse
 
 DEFAULT_BROWSER = "chrome"
 
+# Warm WebDriver pool used by dom_scraper (see driver_pool.py)
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+DRIVER_MAX_USES = int(os.getenv("DRIVER_MAX_USES", "20"))
+DRIVER_LEASE_TIMEOUT = float(os.getenv("DRIVER_LEASE_TIMEOUT", "120"))
+
+# Max pages scraped in parallel after login, kept low to avoid hammering staging
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "3"))
+
+# Hydration detection: the page counts as hydrated once DOM and network are quiet this long
+HYDRATION_QUIET_MS = int(os.getenv("HYDRATION_QUIET_MS", "500"))
+HYDRATION_TIMEOUT = int(os.getenv("HYDRATION_TIMEOUT", "20"))
+
+# How long a scraped DOM snapshot may be reused before a full re-scrape (seconds)
+DOM_CACHE_TTL = int(os.getenv("DOM_CACHE_TTL", "86400"))
+
+# Re-scrapes with at most this many added/removed/changed locators patch the previous
+# Page Object instead of re-prompting the LLM (see dom_diff.py)
+DOM_PATCH_MAX_CHANGES = int(os.getenv("DOM_PATCH_MAX_CHANGES", "10"))
+
+# Clickable elements (buttons/links) kept in the prompt per request; form controls are always kept
+ELEMENT_TOP_K = int(os.getenv("ELEMENT_TOP_K", "40"))
+
+# Out-of-process local model host (see model_host.py); set MODEL_HOST_ENABLED=0 to load in-process
+MODEL_HOST_ENABLED = os.getenv("MODEL_HOST_ENABLED", "1") == "1"
+MODEL_HOST_ADDRESS = ("127.0.0.1", int(os.getenv("MODEL_HOST_PORT", "6011")))
+# Connections unpickle their messages, so the authkey must stay secret: unless MODEL_HOST_AUTHKEY is
+# set, model_host generates a random per-install key in MODEL_HOST_KEY_PATH (mode 0600)
+MODEL_HOST_AUTHKEY = os.getenv("MODEL_HOST_AUTHKEY")
+MODEL_HOST_KEY_PATH = os.getenv("MODEL_HOST_KEY_PATH", "cache/model_host.key")
+MODEL_HOST_LOAD_TIMEOUT = int(os.getenv("MODEL_HOST_LOAD_TIMEOUT", "900"))
+
+# Local model weights: float32 (original), bfloat16 (half the RAM) or int8 (dynamic quantization of Linear layers)
+LOCAL_PRECISION_MODES = ("float32", "bfloat16", "int8")
+LOCAL_PRECISION = os.getenv("LOCAL_PRECISION", "float32")
+
+# Local models kept loaded at once (LRU-evicted past this many MB of weights), and whether the
+# app preloads the default model in the background at startup
+MODEL_RAM_BUDGET_MB = int(os.getenv("MODEL_RAM_BUDGET_MB", "8192"))
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "1") == "1"
+
+# Reuse the attention KV cache of the restriction prompt across local generations
+KV_PREFIX_CACHE = os.getenv("KV_PREFIX_CACHE", "1") == "1"
+
+# Batch concurrent local generation requests that arrive within BATCH_WINDOW_MS of each other
+LOCAL_BATCHING = os.getenv("LOCAL_BATCHING", "1") == "1"
+BATCH_WINDOW_MS = int(os.getenv("BATCH_WINDOW_MS", "50"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "4"))
+
+# Local generation stops once the PAGE and TEST class blocks are closed; the reply budget
+# grows with the number of DOM elements in the prompt (base + per element, capped)
+EARLY_STOP_CLASS_BLOCKS = os.getenv("EARLY_STOP_CLASS_BLOCKS", "1") == "1"
+MAX_NEW_TOKENS_BASE = int(os.getenv("MAX_NEW_TOKENS_BASE", "320"))
+MAX_NEW_TOKENS_PER_ELEMENT = int(os.getenv("MAX_NEW_TOKENS_PER_ELEMENT", "48"))
+MAX_NEW_TOKENS_CAP = int(os.getenv("MAX_NEW_TOKENS_CAP", "1536"))
+
+# OpenAI client (see openai_client.py); OPENAI_BASE_URL can point at openai_stub_server.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+
+# Context windows (tokens) used by prompt_packer to fit DOM + help docs into the prompt;
+# PROMPT_TOKEN_BUDGET > 0 overrides the computed budget for every model
+MODEL_CONTEXT_LIMITS = {
+    "TinyLlama/TinyLlama-1.1B-Chat-v1.0": 2048,
+    "teknium/OpenHermes-2.5-Mistral-7B": 8192,
+    "mistralai/Mistral-7B-Instruct-v0.2": 32768,
+    "google/gemma-2b": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_LIMIT = int(os.getenv("DEFAULT_CONTEXT_LIMIT", "2048"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+
+# Versioned FAISS indexes: where versions live, how many to keep for rollback, and the embedding model
+RAG_VERSIONS_DIR = os.getenv("RAG_VERSIONS_DIR", "rag_versions")
+RAG_KEEP_VERSIONS = int(os.getenv("RAG_KEEP_VERSIONS", "5"))
+RAG_EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Help-site crawling for URL ingestion: link depth from the start page, page cap, parallel
+# fetches, and requests/sec allowed per host
+HELP_CRAWL_MAX_DEPTH = int(os.getenv("HELP_CRAWL_MAX_DEPTH", "2"))
+HELP_CRAWL_MAX_PAGES = int(os.getenv("HELP_CRAWL_MAX_PAGES", "200"))
+HELP_CRAWL_WORKERS = int(os.getenv("HELP_CRAWL_WORKERS", "8"))
+HELP_CRAWL_RATE_PER_HOST = float(os.getenv("HELP_CRAWL_RATE_PER_HOST", "10"))
+
+# Help-doc embedding: chunks per embedding call and parallel embedding workers. Each extra worker
+# loads its own model copy and competes with torch's own threads; measure with
+# `python doc_ingestor.py --bench-workers` before raising it.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+# How often (seconds) rag_search checks for a newly ingested FAISS index to hot-swap in
+RAG_RELOAD_CHECK_SECONDS = float(os.getenv("RAG_RELOAD_CHECK_SECONDS", "5"))
+
+ENVIRONMENT_URLS = {
+    "production": "https://my.charitableimpact.com/users/login",
+    "qa": "https://my.qa.charitableimpact.com/users/login",
+    "stage": "https://my.stg.charitableimpact.com/users/login"
+}
+
+# Saved login sessions without an explicit cookie expiry are trusted for this long (seconds)
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", "43200"))
+
 def get_target_url(env_choice):
-    return {
-        "production": "https://my.charitableimpact.com/users/login",
-        "qa": "https://my.qa.charitableimpact.com/users/login",
-        "stage": "https://my.stg.charitableimpact.com/users/login"
-    }.get(env_choice.lower(), "https://my.stg.charitableimpact.com/users/login")
+    return ENVIRONMENT_URLS.get(env_choice.lower(), ENVIRONMENT_URLS["stage"])
+
+def get_env_for_url(url):
+    """Map any URL on a known host back to its environment name (falls back to the host itself)"""
+    host = urlparse(url).netloc.lower()
+    for env, env_url in ENVIRONMENT_URLS.items():
+        if urlparse(env_url).netloc.lower() == host:
+            return env
+    return host
@@ -1,81 +1,299 @@
-# doc_ingestor.py (Enhanced with multi-page URL scraping support)
+# doc_ingestor.py (Enhanced with multi-page URL crawling support, see help_crawler.py)
 
+import hashlib
 import os
-import requests
-from bs4 import BeautifulSoup
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-def get_all_help_links(base_url: str) -> list:
-    """
-    Crawl all internal help page links from the given base URL.
-    """
+from config import RAG_EMBEDDING_MODEL, EMBED_BATCH_SIZE, EMBED_WORKERS
+from index_registry import index_registry
+from help_crawler import HelpCrawler, pages_to_documents
+
+def chunk_id(chunk) -> str:
+    """Content hash of a chunk, its source page and its ingestion; unchanged chunks keep their id across ingestions"""
+    key = f"{chunk.metadata.get('ingest_source', '')}\n{chunk.metadata.get('source', '')}\n{chunk.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_current_index(embedding):
+    """FAISS store of the current published version if it can be extended with `embedding`, else None"""
+    path = index_registry.current_path()
+    if not path:
+        return None
+    metadata = index_registry.get_metadata(os.path.basename(path))
+    if metadata.get("embedding_model") != RAG_EMBEDDING_MODEL:
+        print(f"♻️ Current index {path} was built with another embedding model, rebuilding from scratch")
+        return None
     try:
-        response = requests.get(base_url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        links = set()
-        for a_tag in soup.find_all("a", href=True):
-            href = a_tag['href']
-            if href.startswith("/"):
-                links.add(base_url.rstrip("/") + href)
-            elif href.startswith(base_url):
-                links.add(href)
-        return list(links)
+        return FAISS.load_local(path, embedding, allow_dangerous_deserialization=True)
     except Exception as e:
-        print(f"❌ Failed to crawl: {e}")
-        return [base_url]  # fallback to base page only
+        print(f"⚠️ Could not load current index {path} ({e}), rebuilding from scratch")
+        return None
+
+
+_embedding = None
+_embedding_lock = threading.Lock()
+
+
+def make_embedding():
+    return HuggingFaceEmbeddings(model_name=RAG_EMBEDDING_MODEL, encode_kwargs={"batch_size": EMBED_BATCH_SIZE})
+
+
+def get_embedding():
+    """One embedding model per process, reused by every ingestion"""
+    global _embedding
+    with _embedding_lock:
+        if _embedding is None:
+            _embedding = make_embedding()
+        return _embedding
+
+
+class StreamingIndexer:
+    """
+    Embeds chunks in batches of `batch_size` on a pool of `workers` threads while loading and
+    splitting continue, and adds finished batches to the FAISS store in submission order.
+    At most 2 x workers batches are in flight, so memory stays flat however large the source is.
+
+    A tokenizer must not be used from two threads at once, so every worker beyond the first
+    embeds with its own model copy (loaded up front). torch already spreads one batch over
+    all cores; check benchmark_embed_workers before raising EMBED_WORKERS above 1.
+    """
+    def __init__(self, embedding, vectorstore=None, batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS, on_progress=None):
+        workers = max(1, workers)
+        self.embedding = embedding
+        self.vectorstore = vectorstore
+        self.batch_size = batch_size
+        self.max_in_flight = workers * 2
+        self.on_progress = on_progress
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+        self._worker_embeddings = [embedding] + [make_embedding() for _ in range(workers - 1)]
+        self._worker_lock = threading.Lock()
+        self._local = threading.local()
+        self.batch = []
+        self.pending = deque()
+        self.added = 0
+        self.start = time.time()
+
+    def add(self, chunk_id, chunk):
+        self.batch.append((chunk_id, chunk))
+        if len(self.batch) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        batch, self.batch = self.batch, []
+        future = self.pool.submit(self._embed, [chunk.page_content for _, chunk in batch])
+        self.pending.append((batch, future))
+        while len(self.pending) > self.max_in_flight:
+            self._drain_one()
 
-def ingest_doc(source_path_or_url="cache/uploaded_help.pdf", is_url=False):
+    def _embed(self, texts):
+        # The pool never runs more threads than there are embeddings, so each thread claims one for good
+        if not hasattr(self._local, "embedding"):
+            with self._worker_lock:
+                self._local.embedding = self._worker_embeddings.pop()
+        return self._local.embedding.embed_documents(texts)
+
+    def _drain_one(self):
+        batch, future = self.pending.popleft()
+        vectors = future.result()
+        text_embeddings = [(chunk.page_content, vector) for (_, chunk), vector in zip(batch, vectors)]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        ids = [chunk_id for chunk_id, _ in batch]
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_embeddings(text_embeddings, self.embedding, metadatas=metadatas, ids=ids)
+        else:
+            self.vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        self.added += len(batch)
+        progress = self.get_progress()
+        print(f"🧮 Embedded {progress['chunks_embedded']} chunks ({progress['chunks_per_sec']} chunks/sec)")
+        if self.on_progress:
+            self.on_progress(progress)
+
+    def finish(self):
+        """Embed what is left and return the updated store (None if nothing was ever added)"""
+        if self.batch:
+            self._submit()
+        while self.pending:
+            self._drain_one()
+        self.pool.shutdown()
+        return self.vectorstore
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_progress(self):
+        seconds = time.time() - self.start
+        return {
+            "chunks_embedded": self.added,
+            "embed_seconds": round(seconds, 2),
+            "chunks_per_sec": round(self.added / seconds, 2) if seconds else 0.0,
+        }
+
+
+def _with_source(document, source_key):
+    """Report the uploaded file's name, not the shared upload path, as the PDF page's source"""
+    document.metadata["source"] = source_key
+    return document
+
+
+def ingest_doc(source_path_or_url="cache/uploaded_help.pdf", is_url=False, full_rebuild=False, on_progress=None, source_key=None):
     """
-    Ingests either a PDF file or all help pages from a URL, and stores FAISS index locally.
+    Ingests either a PDF file or all help pages from a URL into a new FAISS index version
+    and publishes it as the current one (see index_registry).
+
+    Ingestion is incremental: chunks are identified by content hash, so only chunks not already
+    in the current index are embedded, and chunks previously ingested from the same source that
+    no longer exist (changed or removed pages) are deleted. Other sources' chunks are kept.
+    Documents are loaded, split and embedded as a stream (see StreamingIndexer); `on_progress`
+    receives the embedding progress after every batch.
+
+    `source_key` names the source for that bookkeeping (defaults to the path or URL). Uploads
+    are all saved to the same path, so the app passes the uploaded file's name; otherwise a
+    second manual would replace the first one's chunks.
     """
+    start = time.time()
+    source_key = source_key or source_path_or_url
+    crawl_stats = None
     if is_url:
         print(f"🌐 Crawling and loading from: {source_path_or_url}")
-        all_links = get_all_help_links(source_path_or_url)
-        print(f"🔗 Found {len(all_links)} links.")
-        loader = WebBaseLoader(all_links)
+        # Breadth-first, concurrent and rate limited; unchanged pages come back from the
+        # conditional-GET cache without being re-downloaded
+        crawler = HelpCrawler(source_path_or_url)
+        pages = crawler.crawl()
+        crawl_stats = crawler.stats
+        if not pages:
+            return f"❌ Error loading documents: nothing could be fetched from {source_path_or_url}"
+        documents = pages_to_documents(pages)
     else:
         if not os.path.exists(source_path_or_url):
             print(f"❌ File not found: {source_path_or_url}")
             return "❌ File not found."
         print(f"📄 Loading PDF: {source_path_or_url}")
-        loader = PyPDFLoader(source_path_or_url)
+        documents = PyPDFLoader(source_path_or_url).lazy_load()  # one page at a time
+        documents = (_with_source(document, source_key) for document in documents)
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    embedding = get_embedding()
+    vectorstore = None if full_rebuild else load_current_index(embedding)
+    existing = vectorstore.docstore._dict if vectorstore is not None else {}
+    indexer = StreamingIndexer(embedding, vectorstore, on_progress=on_progress)
 
+    print(f"✂️ Splitting and embedding (batches of {indexer.batch_size}, {EMBED_WORKERS} workers)...")
+    seen = set()
+    document_count = reused = 0
     try:
-        documents = loader.load()
+        for document in documents:
+            document_count += 1
+            for chunk in splitter.split_documents([document]):
+                # Tag every chunk with the ingestion it came from, so a later run of the same
+                # source can tell which of its old chunks have disappeared
+                chunk.metadata["ingest_source"] = source_key
+                cid = chunk_id(chunk)
+                if cid in seen:
+                    continue  # identical chunks are embedded once
+                seen.add(cid)
+                if cid in existing:
+                    reused += 1
+                    continue
+                indexer.add(cid, chunk)
+        vectorstore = indexer.finish()
     except Exception as e:
+        indexer.close()
         return f"❌ Error loading documents: {e}"
 
-    print(f"✂️ Splitting into chunks...")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = splitter.split_documents(documents)
+    if vectorstore is None:
+        return "❌ No text could be extracted from the documents."
+    to_remove = [cid for cid, doc in list(existing.items())
+                 if doc.metadata.get("ingest_source") == source_key and cid not in seen]
+    if existing and not indexer.added and not to_remove:
+        print(f"✅ Index already up to date ({reused} chunks unchanged)")
+        return f"✅ Help docs unchanged, current index `{index_registry.current_version()}` is up to date."
 
-    print(f"🔎 Embedding and indexing...")
-    embedding = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectorstore = FAISS.from_documents(chunks, embedding)
+    progress = indexer.get_progress()
+    print(f"🔎 Embedded {indexer.added} new chunks, removing {len(to_remove)} stale chunks, reused {reused}")
+    staging_path = index_registry.new_staging()
+    try:
+        if to_remove:
+            vectorstore.delete(to_remove)
+        print(f"💾 Saving index to staging: {staging_path}")
+        vectorstore.save_local(staging_path)
+        version = index_registry.publish(staging_path, {
+            "source": source_key,
+            "is_url": is_url,
+            "documents": document_count,
+            "chunks": len(vectorstore.index_to_docstore_id),
+            "chunks_added": indexer.added,
+            "chunks_removed": len(to_remove),
+            "chunks_reused": reused,
+            "embedding_model": RAG_EMBEDDING_MODEL,
+            "embed_seconds": progress["embed_seconds"],
+            "chunks_per_sec": progress["chunks_per_sec"],
+            "build_seconds": round(time.time() - start, 2),
+            "crawl": crawl_stats,
+        })
+    except Exception as e:
+        index_registry.discard(staging_path)
+        return f"❌ Error building index: {e}"
+
+    return (f"✅ Ingested {'URL' if is_url else 'PDF'} and published index `{version}` "
+            f"(+{indexer.added} / -{len(to_remove)} chunks, {reused} reused, {progress['chunks_per_sec']} chunks/sec).")
 
-    index_path = "rag_index"
-    print(f"💾 Saving index to: {index_path}")
-    vectorstore.save_local(index_path)
+def benchmark_embed_workers(worker_counts=(1, 2, 4), chunk_count=512, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed the same synthetic chunks through StreamingIndexer with each worker count and report
+    chunks/sec, speedup over 1 worker and the time spent loading extra model copies.
+    """
+    from langchain.schema import Document
+    chunks = [
+        Document(page_content=f"Help article {i}: to update the donation amount open Settings, choose Billing "
+                              f"and edit field {i % 37} before saving. " * 4, metadata={"source": f"bench-{i}"})
+        for i in range(chunk_count)
+    ]
+    embedding = get_embedding()
+    embedding.embed_documents([chunks[0].page_content])  # load weights before the first timed run
+    report = {}
+    for workers in worker_counts:
+        setup_start = time.time()
+        indexer = StreamingIndexer(embedding, batch_size=batch_size, workers=workers)
+        setup_seconds = time.time() - setup_start
+        for chunk in chunks:
+            indexer.add(chunk_id(chunk), chunk)
+        indexer.finish()
+        progress = indexer.get_progress()
+        report[workers] = {"chunks_per_sec": progress["chunks_per_sec"], "embed_seconds": progress["embed_seconds"],
+                           "setup_seconds": round(setup_seconds, 2)}
+    base = report[worker_counts[0]]["chunks_per_sec"]
+    for stats in report.values():
+        stats["speedup"] = round(stats["chunks_per_sec"] / base, 2) if base else None
+    print(f"⏱️ Embedding workers benchmark ({chunk_count} chunks, batch {batch_size}): {report}")
+    return report
 
-    return f"✅ Ingested {'URL' if is_url else 'PDF'} and saved index."
 
 # Optional CLI usage
 if __name__ == "__main__":
     import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-workers":
+        benchmark_embed_workers(tuple(int(n) for n in sys.argv[2:]) or (1, 2, 4))
+        sys.exit(0)
     source = sys.argv[1] if len(sys.argv) > 1 else "cache/uploaded_help.pdf"
     is_url = sys.argv[2].lower() == "true" if len(sys.argv) > 2 else False
-    print(ingest_doc(source, is_url))
+    full_rebuild = len(sys.argv) > 3 and sys.argv[3] == "--full"
+    print(ingest_doc(source, is_url, full_rebuild))
 # Example usage:
 # python doc_ingestor.py "https://example.com/help" true
 # python doc_ingestor.py "cache/uploaded_help.pdf" false
-# This script can be run directly to ingest documents or URLs and create a FAISS index.
+# python doc_ingestor.py "cache/uploaded_help.pdf" false --full   (re-embed everything)
+# python doc_ingestor.py --bench-workers 1 2 4   (compare EMBED_WORKERS settings)
+# This script can be run directly to ingest documents or URLs and publish a new FAISS index version.
 # It supports both PDF files and crawling multiple help pages from a URL.
-# The index is saved locally for later retrieval in RAG workflows.
-# Make sure to install required packages: requests, beautifulsoup4, langchain_community
+# Each index is saved as a version under rag_versions/ for later retrieval and rollback.
+# Make sure to install required packages: requests, beautifulsoup4, langchain_community (help_crawler.py uses the first two)
 # You can install them via pip:
 # pip install requests beautifulsoup4 langchain-community
 # Ensure you have the necessary environment set up for LangChain and FAISS.
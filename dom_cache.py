@@ -0,0 +1,115 @@
+#dom_cache.py
+import hashlib
+import os
+import threading
+import time
+
+import requests
+from tinydb import TinyDB, Query
+
+from config import DOM_CACHE_TTL
+from session_store import SessionStore
+
+# This file implements a persistent cache of scraped DOM element lists so repeated prompts
+# can skip relaunching Chrome for pages that have not changed since the last scrape.
+class DomSnapshotCache:
+    def __init__(self, db_path='cache/dom_snapshots.json', ttl=DOM_CACHE_TTL, probe_timeout=5, session_store=None):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = TinyDB(db_path)
+        self.snapshots = self.db.table("snapshots")
+        self.stats_table = self.db.table("stats")
+        self.ttl = ttl
+        self.probe_timeout = probe_timeout
+        self.session_store = session_store or SessionStore()
+        self.query = Query()
+        self._lock = threading.Lock()
+
+    def _key(self, env, url, auth_mode) -> str:
+        return hashlib.sha256(f"{env}::{url}::{auth_mode}".lower().encode()).hexdigest()
+
+    def fingerprint(self, url, cookies=None):
+        """
+        Cheap page fingerprint: ETag/Last-Modified from a HEAD request when the server
+        sends them, otherwise a hash of the served HTML.
+        """
+        jar = {c["name"]: c["value"] for c in cookies or []}
+        try:
+            head = requests.head(url, timeout=self.probe_timeout, allow_redirects=True, cookies=jar)
+            validator = head.headers.get("ETag") or head.headers.get("Last-Modified")
+            if validator:
+                return f"validator:{validator}"
+            response = requests.get(url, timeout=self.probe_timeout, cookies=jar)
+            response.raise_for_status()
+            return f"sha256:{hashlib.sha256(response.content).hexdigest()}"
+        except Exception as e:
+            print(f"⚠️ Fingerprint probe failed for {url}: {e}")
+            return None
+
+    def _probe_cookies(self, url, auth_mode):
+        """
+        Cookies to fingerprint with: the saved session for the URL's environment for logged-in
+        modes, none for anonymous. store() and get() both use this, so a page is always compared
+        against a fingerprint taken with the same credentials.
+        """
+        if auth_mode == "anonymous":
+            return None
+        entry = self.session_store.load(url)
+        return entry["cookies"] if entry else None
+
+    def get(self, env, url, auth_mode):
+        """Return cached elements if the snapshot is within TTL and its fingerprint still matches"""
+        entry = self.snapshots.get(self.query.key == self._key(env, url, auth_mode))
+        if not entry:
+            self._count("misses")
+            return None
+        if time.time() - entry["scraped_at"] > self.ttl:
+            print(f"⌛ DOM snapshot expired for {url}")
+            self._count("misses")
+            return None
+        if not entry.get("fingerprint") or self.fingerprint(url, self._probe_cookies(url, auth_mode)) != entry["fingerprint"]:
+            print(f"🔄 DOM snapshot stale for {url}")
+            self._count("misses")
+            return None
+        print(f"⚡ DOM snapshot hit for {url} (saved ~{entry['scrape_seconds']} sec)")
+        self._count("hits", saved=entry["scrape_seconds"])
+        return entry["elements"]
+
+    def peek(self, env, url, auth_mode):
+        """Last stored elements for the page regardless of TTL or freshness (used for diffing)"""
+        entry = self.snapshots.get(self.query.key == self._key(env, url, auth_mode))
+        return entry["elements"] if entry else None
+
+    def store(self, env, url, auth_mode, elements, scrape_seconds):
+        if not elements:
+            return False
+        key = self._key(env, url, auth_mode)
+        self.snapshots.upsert({
+            "key": key,
+            "env": env,
+            "url": url,
+            "auth_mode": auth_mode,
+            "elements": elements,
+            "fingerprint": self.fingerprint(url, self._probe_cookies(url, auth_mode)),
+            "scraped_at": time.time(),
+            "scrape_seconds": round(scrape_seconds, 2),
+        }, self.query.key == key)
+        return True
+
+    def _count(self, field, saved=0.0):
+        with self._lock:
+            stats = self.stats_table.get(doc_id=1) or {"hits": 0, "misses": 0, "time_saved_sec": 0.0}
+            stats[field] += 1
+            stats["time_saved_sec"] = round(stats["time_saved_sec"] + saved, 2)
+            self.stats_table.upsert(stats, self.query.hits.exists())
+
+    def get_stats(self):
+        stats = self.stats_table.get(doc_id=1) or {"hits": 0, "misses": 0, "time_saved_sec": 0.0}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 2) if lookups else 0.0
+        stats["snapshots"] = len(self.snapshots)
+        return stats
+
+    def clear_cache(self):
+        self.snapshots.truncate()
+        self.stats_table.truncate()
+        return "✅ DOM snapshot cache cleared."
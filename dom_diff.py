@@ -0,0 +1,129 @@
+# dom_diff.py
+import re
+
+# Compares two scrapes of the same page (lists of element dicts from
+# dom_scraper.scrape_input_fields_after_login) and patches an existing Page Object
+# so iterative runs don't have to re-prompt the LLM for the whole page.
+
+COMPARED_FIELDS = ("name", "by", "selector", "action", "type", "label")
+FINDBY_ATTRIBUTE = {"id": "id", "name": "name", "css": "css", "xpath": "xpath"}
+
+
+def _identity(el):
+    """Stable identity of an element: the raw label (data-testid/name/id/...) plus its type"""
+    return (el.get("label", "").strip().lower(), el.get("type", ""))
+
+
+def _locator(el):
+    return (el.get("by"), el.get("selector"))
+
+
+def diff_snapshots(old_elements, new_elements):
+    """
+    Match elements across two snapshots, first by identical locator, then by label and type.
+    Returns {"added": [...], "removed": [...], "changed": [{"old", "new", "fields"}], "unchanged": int}.
+    """
+    old_left = list(old_elements or [])
+    new_left = list(new_elements or [])
+    pairs = []
+
+    for matcher in (_locator, _identity):
+        unmatched_new = []
+        for new_el in new_left:
+            match = next((old_el for old_el in old_left if matcher(old_el) == matcher(new_el)), None)
+            if match is None:
+                unmatched_new.append(new_el)
+                continue
+            old_left.remove(match)
+            pairs.append((match, new_el))
+        new_left = unmatched_new
+
+    changed = []
+    unchanged = 0
+    for old_el, new_el in pairs:
+        fields = [f for f in COMPARED_FIELDS if old_el.get(f) != new_el.get(f)]
+        if fields:
+            changed.append({"old": old_el, "new": new_el, "fields": fields})
+        else:
+            unchanged += 1
+
+    return {"added": new_left, "removed": old_left, "changed": changed, "unchanged": unchanged}
+
+
+def diff_is_empty(diff):
+    return not (diff["added"] or diff["removed"] or diff["changed"])
+
+
+def summarize_diff(diff):
+    lines = [f"➕ {el['name']} ({el['by']}={el['selector']})" for el in diff["added"]]
+    lines += [f"➖ {el['name']} ({el['by']}={el['selector']})" for el in diff["removed"]]
+    lines += [
+        f"✏️ {c['old']['name']}: " + ", ".join(f"{f} {c['old'].get(f)!r} → {c['new'].get(f)!r}" for f in c["fields"])
+        for c in diff["changed"]
+    ]
+    return "\n".join(lines) if lines else "No DOM changes."
+
+
+def _field_name(name):
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+    if name[0].isdigit():
+        name = f"el_{name}"
+    return name
+
+
+def _java_string_body(value):
+    """Escape a selector for use inside a Java string literal (XPaths like id("main")/div[2] contain quotes)"""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _findby_pattern(el):
+    attribute = FINDBY_ATTRIBUTE.get(el["by"], el["by"])
+    return re.compile(rf'@FindBy\(\s*{attribute}\s*=\s*"{re.escape(_java_string_body(el["selector"]))}"\s*\)')
+
+
+def _findby_annotation(el):
+    return f'@FindBy({FINDBY_ATTRIBUTE.get(el["by"], "xpath")} = "{_java_string_body(el["selector"])}")'
+
+
+def patch_page_object(java_code, diff):
+    """
+    Apply a snapshot diff to previously generated code: rewrite changed locators in place,
+    flag removed fields (kept so existing methods still compile) and append added fields.
+    Returns (patched_code, unresolved) where unresolved lists elements whose field could not be found.
+    """
+    unresolved = []
+
+    for change in diff["changed"]:
+        old_el, new_el = change["old"], change["new"]
+        pattern = _findby_pattern(old_el)
+        if pattern.search(java_code):
+            java_code = pattern.sub(lambda _: _findby_annotation(new_el), java_code, count=1)
+        else:
+            unresolved.append(old_el)
+
+    for el in diff["removed"]:
+        pattern = _findby_pattern(el)
+        match = pattern.search(java_code)
+        if match:
+            java_code = java_code[:match.start()] + "// ⚠️ Element no longer found on page\n    " + java_code[match.start():]
+        else:
+            unresolved.append(el)
+
+    if diff["added"]:
+        new_fields = "\n".join(
+            f'    // Type: {el["type"]}, Original name: {el["name"]}\n'
+            f'    {_findby_annotation(el)}\n'
+            f'    private WebElement {_field_name(el["name"])};'
+            for el in diff["added"]
+        )
+        fields = list(re.finditer(r'@FindBy\((?:"(?:\\.|[^"\\])*"|[^")])*\)\s*\n\s*(private|public|protected)?\s*WebElement\s+\w+\s*;', java_code))
+        if fields:
+            insert_at = fields[-1].end()
+        else:
+            class_open = re.search(r"public\s+class\s+\w+[^{]*\{", java_code)
+            if not class_open:
+                return java_code, unresolved + diff["added"]
+            insert_at = class_open.end()
+        java_code = java_code[:insert_at] + "\n\n" + new_fields + java_code[insert_at:]
+
+    return java_code, unresolved
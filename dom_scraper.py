@@ -7,11 +7,17 @@ from selenium.webdriver.support import expected_conditions as EC
 import undetected_chromedriver as uc
 import re
 import time
-import pickle
 import os
-from selenium.common.exceptions import TimeoutException
+import tempfile
+import json
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from driver_pool import get_driver_pool
+from session_store import SessionStore, set_browser_cookies
+from config import SCRAPE_CONCURRENCY, HYDRATION_TIMEOUT, HYDRATION_QUIET_MS
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 
-COOKIE_FILE = "cookies.pkl"
+session_store = SessionStore()
 
 def format_dom_compact(dom_elements):
     """Return compact LLM-friendly DOM as text block"""
@@ -41,44 +47,325 @@ def save_cookies_after_manual_login(url):
 
     driver.get(url)
     input("🔐 Complete login and press ENTER to save cookies...")
-    with open(COOKIE_FILE, "wb") as f:
-        pickle.dump(driver.get_cookies(), f)
-        print(f"✅ Cookies saved to {COOKIE_FILE}")
+    session_store.save(url, driver.get_cookies())
     driver.quit()
 
-def load_browser_with_cookies(url):
-    print("🚀 Launching browser with saved cookies...")
-    options = uc.ChromeOptions()
-    driver = uc.Chrome(options=options, version_main=137)
-    driver.get(url)
-    time.sleep(2)
-
-    if os.path.exists(COOKIE_FILE):
-        with open(COOKIE_FILE, "rb") as f:
-            cookies = pickle.load(f)
-            for cookie in cookies:
-                if "sameSite" in cookie:
-                    del cookie["sameSite"]
-                driver.add_cookie(cookie)
-            print(f"✅ {len(cookies)} cookies loaded")
-    else:
-        print("⚠️ No cookie file found.")
+def load_browser_with_cookies(url, driver=None):
+    if driver is None:
+        print("🚀 Launching browser with saved cookies...")
+        options = uc.ChromeOptions()
+        driver = uc.Chrome(options=options, version_main=137)
 
+    # Cookies go in before the first navigation, so the page loads once, already authenticated
+    session_store.inject(driver, url)
     driver.get(url)
     return driver
 
-def wait_for_js_hydration(driver, timeout=20):
+# Resolves once the page has loaded, no fetch/XHR is in flight and neither the DOM nor the
+# resource timeline has changed for `quietMs`. Used with execute_async_script.
+HYDRATION_SCRIPT = r"""
+const quietMs = arguments[0];
+const timeoutMs = arguments[1];
+const done = arguments[arguments.length - 1];
+const start = performance.now();
+
+const tracker = window.__aiTestBotNetwork || (window.__aiTestBotNetwork = (function() {
+    const t = {inflight: 0};
+    if (window.fetch) {
+        const originalFetch = window.fetch;
+        window.fetch = function() {
+            t.inflight++;
+            return originalFetch.apply(this, arguments).finally(() => t.inflight--);
+        };
+    }
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        t.inflight++;
+        this.addEventListener("loadend", () => t.inflight--, {once: true});
+        return originalSend.apply(this, arguments);
+    };
+    return t;
+})());
+
+let lastActivity = start;
+let mutations = 0;
+let resources = performance.getEntriesByType("resource").length;
+const observer = new MutationObserver(records => {
+    mutations += records.length;
+    lastActivity = performance.now();
+});
+observer.observe(document, {
+    childList: true, subtree: true, characterData: true,
+    attributes: true, attributeFilter: ["id", "name", "type", "disabled", "hidden"],
+});
+
+const timer = setInterval(() => {
+    const now = performance.now();
+    const resourceCount = performance.getEntriesByType("resource").length;
+    if (resourceCount !== resources || document.readyState !== "complete" || tracker.inflight > 0) {
+        resources = resourceCount;
+        lastActivity = now;
+    }
+    const quiet = now - lastActivity >= quietMs;
+    const timedOut = now - start >= timeoutMs;
+    if (quiet || timedOut) {
+        clearInterval(timer);
+        observer.disconnect();
+        done({
+            hydration_ms: Math.round(lastActivity - start),
+            waited_ms: Math.round(now - start),
+            mutations: mutations,
+            inflight: tracker.inflight,
+            timed_out: !quiet,
+        });
+    }
+}, 50);
+"""
+
+def wait_for_js_hydration(driver, timeout=HYDRATION_TIMEOUT, quiet_ms=HYDRATION_QUIET_MS):
+    """
+    Wait until the DOM and network have been quiet for `quiet_ms`, instead of polling for inputs.
+    Returns the hydration report from the page (hydration_ms, waited_ms, mutations, timed_out),
+    or None when the detector could not run.
+    """
     try:
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.XPATH, '//input'))
-        )
-        WebDriverWait(driver, timeout).until(
-            lambda d: any(el.get_attribute("id") for el in d.find_elements(By.XPATH, '//input'))
-        )
+        driver.set_script_timeout(timeout + 5)
+        report = driver.execute_async_script(HYDRATION_SCRIPT, quiet_ms, timeout * 1000)
+        status = "⚠️ Hydration timed out" if report["timed_out"] else "💧 Hydrated"
+        print(f"{status} after {report['hydration_ms']} ms (waited {report['waited_ms']} ms, {report['mutations']} mutations)")
+        return report
     except Exception as e:
         print(f"⚠️ Timeout or hydration issue: {e}")
+        return None
+
+# XPath used to collect every interactive element we generate locators for
+INTERACTIVE_ELEMENTS_XPATH = "//input | //textarea | //select | //button | //*[@role='button'] | //a[@href] | //div[@role='button']"
+
+# JS helper shared by the scripts below: absolute XPath for an element,
+# anchored on the nearest ancestor with a unique id.
+ABSOLUTE_XPATH_JS = r"""
+function absoluteXPath(element) {
+    const idx = (sib, name) => sib
+        ? idx(sib.previousElementSibling, name || sib.localName) + (sib.localName == name)
+        : 1;
+    const segs = elm => !elm || elm.nodeType !== 1
+        ? ['']
+        : elm.id && document.getElementById(elm.id) === elm
+        ? [`id("${elm.id}")`]
+        : [...segs(elm.parentNode), `${elm.localName.toLowerCase()}[${idx(elm)}]`];
+    return segs(element).join('/')
+}
+"""
+
+# Landmark tags/roles used to tag each element with the page region it sits in
+REGION_BY_TAG = {"dialog": "dialog", "form": "form", "nav": "nav", "header": "header", "footer": "footer", "aside": "aside", "main": "main"}
+REGION_BY_ROLE = {"dialog": "dialog", "form": "form", "navigation": "nav", "banner": "header", "contentinfo": "footer", "complementary": "aside", "main": "main"}
+
+# JS helper: nearest landmark ancestor of an element ("" when there is none)
+REGION_JS = r"""
+function regionOf(element) {
+    const byTag = %s;
+    const byRole = %s;
+    for (let n = element.parentElement; n; n = n.parentElement) {
+        const role = (n.getAttribute("role") || "").toLowerCase();
+        const region = byRole[role] || byTag[n.tagName.toLowerCase()];
+        if (region) return region;
+    }
+    return "";
+}
+""" % (json.dumps(REGION_BY_TAG), json.dumps(REGION_BY_ROLE))
+
+REGION_SCRIPT = REGION_JS + r"""
+return regionOf(arguments[0]);
+"""
+
+# Counts every id, class token and name on the page in a single DOM pass
+SELECTOR_INDEX_SCRIPT = r"""
+const index = {id: {}, class: {}, name: {}};
+for (const el of document.querySelectorAll("[id], [class], [name]")) {
+    const id = el.getAttribute("id");
+    if (id) index.id[id] = (index.id[id] || 0) + 1;
+    const name = el.getAttribute("name");
+    if (name) index.name[name] = (index.name[name] || 0) + 1;
+    for (const cls of new Set(el.classList)) {
+        index.class[cls] = (index.class[cls] || 0) + 1;
+    }
+}
+return index;
+"""
+
+# Fallback XPaths for a whole list of elements in one execute_script call
+ABSOLUTE_XPATHS_SCRIPT = ABSOLUTE_XPATH_JS + r"""
+return arguments[0].map(absoluteXPath);
+"""
+
+# Collects visibility, enabled state, attributes, labels and regions for every matching
+# element, plus the selector index, in a single execute_script roundtrip.
+BULK_EXTRACT_SCRIPT = REGION_JS + r"""
+const xpath = arguments[0];
+const snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+
+const labelsFor = new Map();
+for (const l of document.querySelectorAll("label")) {
+    if (!labelsFor.has(l.htmlFor)) labelsFor.set(l.htmlFor, l.innerText);
+}
+
+function isVisible(el) {
+    if (!el.isConnected) return false;
+    if (el.tagName === "INPUT" && (el.type || "").toLowerCase() === "hidden") return false;
+    const style = window.getComputedStyle(el);
+    if (style.display === "none" || style.visibility === "hidden" || style.visibility === "collapse") return false;
+    if (parseFloat(style.opacity) === 0) return false;
+    return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+}
+
+const elements = [];
+for (let i = 0; i < snapshot.snapshotLength; i++) {
+    const el = snapshot.snapshotItem(i);
+    const visible = isVisible(el);
+    const enabled = !(el.matches && el.matches(":disabled"));
+    if (!visible || !enabled) {
+        elements.push({visible: visible, enabled: enabled});
+        continue;
+    }
+    const attr = name => el.getAttribute(name) || "";
+    elements.push({
+        visible: visible,
+        enabled: enabled,
+        element: el,
+        tag: el.tagName.toLowerCase(),
+        type: el.tagName === "INPUT" ? (el.type || "") : attr("type"),
+        attrs: {
+            "data-testid": attr("data-testid"),
+            "data-cy": attr("data-cy"),
+            "name": attr("name"),
+            "id": attr("id"),
+            "placeholder": attr("placeholder"),
+            "aria-label": attr("aria-label"),
+            "class": attr("class"),
+        },
+        label: labelsFor.get(el.id) || "",
+        region: regionOf(el),
+    });
+}
+return {elements: elements, index: (function() {""" + SELECTOR_INDEX_SCRIPT + r"""})()};
+"""
+
+
+# Class names usable as-is in a ".class" selector; Tailwind-style names (md:flex, w-1/2) are not
+CSS_IDENTIFIER_RE = re.compile(r"^-?[_a-zA-Z][_a-zA-Z0-9-]*$")
+
+
+class SelectorIndex:
+    """
+    Occurrence counts of every id, class and name on a page, built in one pass.
+    Lets us pick a unique locator strategy without a find_elements call per candidate.
+    """
+    def __init__(self, counts=None):
+        counts = counts or {}
+        self.ids = counts.get("id", {})
+        self.classes = counts.get("class", {})
+        self.names = counts.get("name", {})
+
+    @classmethod
+    def from_driver(cls, driver):
+        return cls(driver.execute_script(SELECTOR_INDEX_SCRIPT))
+
+    def resolve(self, id_attr, class_attr, name_attr):
+        """Return (by, selector) for the first unique id / single valid-identifier class css / name, else (None, None)"""
+        if id_attr and self.ids.get(id_attr) == 1:
+            return "id", id_attr
+        class_name = class_attr.strip() if class_attr else ""
+        if class_name and len(class_name.split()) == 1 and CSS_IDENTIFIER_RE.match(class_name) and self.classes.get(class_name) == 1:
+            return "css", f".{class_name}"
+        if name_attr and self.names.get(name_attr) == 1:
+            return "name", name_attr
+        return None, None
+
+
+class LiveLocatorChecks:
+    """
+    The original locator strategy: one find_elements roundtrip per candidate uniqueness
+    check. Same resolve() interface as SelectorIndex; kept as the benchmark baseline.
+    """
+    def __init__(self, driver):
+        self.driver = driver
+
+    def _unique(self, by, value):
+        return len(self.driver.find_elements(by, value)) == 1
+
+    def resolve(self, id_attr, class_attr, name_attr):
+        if id_attr and self._unique(By.ID, id_attr):
+            return "id", id_attr
+        class_name = class_attr.strip() if class_attr else ""
+        if class_name and len(class_name.split()) == 1 and CSS_IDENTIFIER_RE.match(class_name) and self._unique(By.CSS_SELECTOR, f".{class_name}"):
+            return "css", f".{class_name}"
+        if name_attr and self._unique(By.NAME, name_attr):
+            return "name", name_attr
+        return None, None
+
+
+def resolve_fallback_xpaths(driver, elements):
+    """Absolute XPaths for all given WebElements with a single script execution"""
+    if not elements:
+        return []
+    return driver.execute_script(ABSOLUTE_XPATHS_SCRIPT, elements)
+
+
+def classify_element(tag, input_type):
+    """Map a tag/input type to (action, sampleText, type) used by the page templates"""
+    if tag == "textarea":
+        return "enterText", "sample input", "textarea"
+    if tag == "input":
+        if input_type == "checkbox":
+            return "click", "", "checkbox"
+        if input_type == "radio":
+            return "click", "", "radiobutton"
+        if input_type in ["submit", "button"]:
+            return "click", "", "button"
+        return "enterText", "sample input", "textbox"
+    if tag == "select":
+        return "select", "", "dropdown"
+    return "click", "", "button"
+
+
+def choose_raw_name(attrs, label=""):
+    """Pick the most stable human-readable name for an element, same priority as the per-element path"""
+    return (
+        attrs.get("data-testid")
+        or attrs.get("data-cy")
+        or attrs.get("name")
+        or attrs.get("id")
+        or attrs.get("placeholder")
+        or attrs.get("aria-label")
+        or label
+        or "unknown"
+    )
+
+
+def build_element_metadata(tag, input_type, raw_name, by, selector, region=""):
+    """Assemble the element dict shared by every extraction path"""
+    action, sample_text, element_type = classify_element(tag, input_type)
+    safe_name = sanitize_name(raw_name)
+    print(f"🧪 Raw name used: {raw_name}")
+    return {
+        "name": safe_name,
+        "by": by,
+        "selector": selector,
+        "action": action,
+        "sampleText": sample_text,
+        "type": element_type,
+        "label": raw_name.strip(),
+        "region": region,
+    }
+
 
-def extract_element_metadata(driver, element):
+def extract_element_metadata(driver, element, index=None, resolve_xpath=True):
+    """
+    Per-element metadata extraction. Pass a prebuilt SelectorIndex when scraping many
+    elements; with resolve_xpath=False unresolved elements keep selector None so the
+    caller can batch their XPaths through resolve_fallback_xpaths.
+    """
     def get_label(el):
         label = driver.execute_script('''
             const input = arguments[0];
@@ -104,100 +391,91 @@ def extract_element_metadata(driver, element):
         or "unknown"
     )
 
-    safe_name = sanitize_name(raw_name)
-    print(f"🧪 Raw name used: {raw_name}")
+    if index is None:
+        index = SelectorIndex.from_driver(driver)
 
-    if tag == "textarea":
-        action = "enterText"
-        sample_text = "sample input"
-        element_type = "textarea"
-    elif tag == "input":
-        if input_type == "checkbox":
-            action = "click"
-            sample_text = ""
-            element_type = "checkbox"
-        elif input_type == "radio":
-            action = "click"
-            sample_text = ""
-            element_type = "radiobutton"
-        elif input_type in ["submit", "button"]:
-            action = "click"
-            sample_text = ""
-            element_type = "button"
-        else:
-            action = "enterText"
-            sample_text = "sample input"
-            element_type = "textbox"
-    elif tag == "select":
-        action = "select"
-        sample_text = ""
-        element_type = "dropdown"
-    else:
-        action = "click"
-        sample_text = ""
-        element_type = "button"
-
-    id_attr = element.get_attribute("id")
-    name_attr = element.get_attribute("name")
-    class_attr = element.get_attribute("class")
-
-    by, selector = None, None
-
-    if id_attr:
-        matches = driver.find_elements(By.ID, id_attr)
-        if len(matches) == 1:
-            by = "id"
-            selector = id_attr
-
-    if not selector and class_attr and len(class_attr.split()) == 1:
-        matches = driver.find_elements(By.CSS_SELECTOR, f".{class_attr.strip()}")
-        if len(matches) == 1:
-            by = "css"
-            selector = f".{class_attr.strip()}"
-
-    if not selector and name_attr:
-        matches = driver.find_elements(By.NAME, name_attr)
-        if len(matches) == 1:
-            by = "name"
-            selector = name_attr
-
-    if not selector:
-        by = "xpath"
-        selector = driver.execute_script('''
-            function absoluteXPath(element) {
-                const idx = (sib, name) => sib
-                    ? idx(sib.previousElementSibling, name || sib.localName) + (sib.localName == name)
-                    : 1;
-                const segs = elm => !elm || elm.nodeType !== 1
-                    ? ['']
-                    : elm.id && document.getElementById(elm.id) === elm
-                    ? [`id("${elm.id}")`]
-                    : [...segs(elm.parentNode), `${elm.localName.toLowerCase()}[${idx(elm)}]`];
-                return segs(element).join('/')
-            }
-            return absoluteXPath(arguments[0]);
-        ''', element)
-
-    return {
-        "name": safe_name,
-        "by": by,
-        "selector": selector,
-        "action": action,
-        "sampleText": sample_text,
-        "type": element_type,
-        "label": raw_name.strip(),
-    }
+    by, selector = index.resolve(
+        element.get_attribute("id"),
+        element.get_attribute("class"),
+        element.get_attribute("name"),
+    )
 
-def scrape_input_fields_after_login(driver):
-    wait_for_js_hydration(driver)
-    print("\n🔍 Extracting input fields...")
-    input_elements = driver.find_elements(By.XPATH, "//input | //textarea | //select | //button | //*[@role='button'] | //a[@href] | //div[@role='button']")
+    if not selector and resolve_xpath:
+        by = "xpath"
+        selector = resolve_fallback_xpaths(driver, [element])[0]
+
+    region = driver.execute_script(REGION_SCRIPT, element)
+    return build_element_metadata(tag, input_type, raw_name, by, selector, region)
+
+
+def _fill_fallback_xpaths(driver, metas, elements):
+    """Assign absolute XPaths to every meta left without a unique selector, in one roundtrip"""
+    pending = [i for i, meta in enumerate(metas) if meta is not None and not meta["selector"]]
+    xpaths = resolve_fallback_xpaths(driver, [elements[i] for i in pending])
+    for i, xpath in zip(pending, xpaths):
+        metas[i]["by"] = "xpath"
+        metas[i]["selector"] = xpath
+
+
+def extract_page_elements_bulk(driver, xpath=INTERACTIVE_ELEMENTS_XPATH):
+    """
+    Collect metadata for every element matching `xpath` with one execute_script call,
+    plus one more for the XPaths of elements without a unique id/class/name.
+    Returns one entry per matched element (None for hidden/disabled ones) so callers
+    can keep the same indices as the per-element path.
+    """
+    payload = driver.execute_script(BULK_EXTRACT_SCRIPT, xpath) or {}
+    index = SelectorIndex(payload.get("index"))
+    metas, elements = [], []
+    for entry in payload.get("elements", []):
+        if not entry.get("visible") or not entry.get("enabled"):
+            metas.append(None)
+            elements.append(None)
+            continue
+        attrs = entry["attrs"]
+        raw_name = choose_raw_name(attrs, entry.get("label", ""))
+        by, selector = index.resolve(attrs["id"], attrs["class"], attrs["name"])
+        metas.append(build_element_metadata(entry["tag"], entry["type"], raw_name, by, selector, entry.get("region", "")))
+        elements.append(entry["element"])
+    _fill_fallback_xpaths(driver, metas, elements)
+    return metas
+
+
+def extract_page_elements(driver, bulk=True, legacy=False):
+    """
+    Extract element metadata from the current page without waiting for hydration.
+    legacy=True runs the original path (find_elements per locator check, one XPath script
+    per element); only the benchmark uses it.
+    """
+    if legacy:
+        live_checks = LiveLocatorChecks(driver)
+        metas = [
+            extract_element_metadata(driver, el, index=live_checks)
+            if el.is_displayed() and el.is_enabled() else None
+            for el in driver.find_elements(By.XPATH, INTERACTIVE_ELEMENTS_XPATH)
+        ]
+    elif bulk:
+        metas = extract_page_elements_bulk(driver)
+    else:
+        index = SelectorIndex.from_driver(driver)
+        elements = driver.find_elements(By.XPATH, INTERACTIVE_ELEMENTS_XPATH)
+        metas = []
+        for el in elements:
+            if not el.is_displayed() or not el.is_enabled():
+                metas.append(None)
+                continue
+            metas.append(extract_element_metadata(driver, el, index=index, resolve_xpath=False))
+        _fill_fallback_xpaths(driver, metas, elements)
+
+    return dedupe_element_names(metas)
+
+def dedupe_element_names(metas):
+    """Drop skipped (None) entries and suffix repeated names with the element's match index"""
     results = []
     seen_names = set()
-    for idx, el in enumerate(input_elements):
-        if not el.is_displayed() or not el.is_enabled():
+    for idx, meta in enumerate(metas):
+        if meta is None:
             continue
-        meta = extract_element_metadata(driver, el)
         if meta["name"] in seen_names:
             meta["name"] += f"_{idx}"
         seen_names.add(meta["name"])
@@ -206,14 +484,83 @@ def scrape_input_fields_after_login(driver):
         results.append(meta)
     return results
 
+def scrape_input_fields_after_login(driver, bulk=True):
+    wait_for_js_hydration(driver)
+    print(f"\n🔍 Extracting input fields ({'bulk' if bulk else 'per-element'})...")
+    return extract_page_elements(driver, bulk=bulk)
+
+def _build_benchmark_fixture(element_count):
+    """Write a local HTML page with a mix of form controls, buttons and links"""
+    rows = []
+    for i in range(element_count):
+        kind = i % 6
+        if kind == 0:
+            rows.append(f'<label for="field-{i}">Field {i}</label><input id="field-{i}" name="field_{i}" type="text">')
+        elif kind == 1:
+            rows.append('<input name="shared" type="checkbox" class="check">')
+        elif kind == 2:
+            rows.append(f'<button class="btn-{i}">Button {i}</button>')
+        elif kind == 3:
+            rows.append(f'<a href="#link-{i}" class="nav-link">Link {i}</a>')
+        elif kind == 4:
+            rows.append(f'<select name="choice_{i}"><option>One</option></select>')
+        else:
+            rows.append(f'<div role="button" aria-label="Action {i}" style="display:{"none" if i % 12 == 5 else "block"}">Action</div>')
+    html = "<html><body><form>\n" + "\n".join(f"<div>{r}</div>" for r in rows) + "\n</form></body></html>"
+    fd, path = tempfile.mkstemp(suffix=".html", prefix="dom_bench_")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(html)
+    return path
+
+def benchmark_extraction_modes(element_count=300, runs=3, driver=None):
+    """
+    Compare extraction paths on a local HTML fixture: "legacy" (the original path, one
+    find_elements roundtrip per uniqueness check), "per_element" (one roundtrip set per
+    element, uniqueness from a SelectorIndex) and "bulk" (one script call for the page).
+    Returns average seconds per mode, speedups over legacy and whether all outputs match.
+    """
+    new_driver = False
+    if driver is None:
+        options = Options()
+        options.add_argument("--headless=new")
+        driver = webdriver.Chrome(options=options)
+        new_driver = True
+
+    fixture_path = _build_benchmark_fixture(element_count)
+    modes = {"legacy": {"legacy": True}, "per_element": {"bulk": False}, "bulk": {"bulk": True}}
+    timings = {mode: [] for mode in modes}
+    outputs = {}
+    try:
+        driver.get(f"file://{fixture_path}")
+        for _ in range(runs):
+            for mode, kwargs in modes.items():
+                start = time.perf_counter()
+                outputs[mode] = extract_page_elements(driver, **kwargs)
+                timings[mode].append(time.perf_counter() - start)
+    finally:
+        os.remove(fixture_path)
+        if new_driver:
+            driver.quit()
+
+    report = {"elements": len(outputs["bulk"])}
+    for mode in modes:
+        report[f"{mode}_sec"] = round(sum(timings[mode]) / runs, 3)
+    report["identical"] = outputs["legacy"] == outputs["per_element"] == outputs["bulk"]
+    for mode in ("per_element", "bulk"):
+        report[f"{mode}_speedup"] = round(report["legacy_sec"] / report[f"{mode}_sec"], 1) if report[f"{mode}_sec"] else None
+    print(f"⏱️ Extraction benchmark: {report}")
+    return report
+
 def suggest_validations_authenticated(url, username, password,return_driver=False):
-    options = Options()
-    options.add_argument("--headless=new")
-    driver = webdriver.Chrome(options=options)
-    driver.get(url)
+    # With return_driver=True the leased browser is handed to the caller, who must
+    # give it back with get_driver_pool().release(driver).
+    pool = get_driver_pool()
+    driver = pool.acquire()
     results = []
+    crashed = False
 
     try:
+        driver.get(url)
         wait = WebDriverWait(driver, 20)
 
         # 🚨 Point 2: Warn if URL doesn't look like a login page
@@ -260,58 +607,108 @@ def suggest_validations_authenticated(url, username, password,return_driver=Fals
                             any(e.is_displayed() for e in d.find_elements(By.XPATH, "//*[contains(text(),'Logout') or contains(text(),'My Account')]")))
 
         print("✅ Login successful. Extracting DOM fields.")
+        session_store.save(url, driver.get_cookies())
         results = scrape_input_fields_after_login(driver)
 
     except Exception as e:
+        # A timeout leaves a working browser; only other WebDriver errors mean it died
+        crashed = isinstance(e, WebDriverException) and not isinstance(e, TimeoutException)
         print(f"⚠️ Login failed: {e}")
     finally:
-        if return_driver:
+        if return_driver and not crashed:
             return results, driver
-        else:
-            driver.quit()
-            return results
+        pool.release(driver, crashed=crashed)
+        return (results, None) if return_driver else results
 
 
 
 
-def suggest_validations_with_bypass(url):
-    driver = load_browser_with_cookies(url)
-    wait_for_js_hydration(driver)
-    print(f"🔄 Scraping hydrated page: {driver.current_url}")
-    results = scrape_input_fields_after_login(driver)
-    driver.quit()
-    return results
+def suggest_validations_with_bypass(url, username=None, password=None):
+    # Only probe non-login pages: a login URL always "looks" logged out
+    probe_url = url if "login" not in url.lower() else None
+    if not session_store.is_valid(url, probe_url=probe_url):
+        if username and password:
+            print("🔁 Saved session expired, logging in again...")
+            return suggest_validations_authenticated(url, username, password)
+        raise Exception("❌ Saved session is missing or expired. Run: python dom_scraper.py --save-cookies <login url>")
 
-def suggest_validations_smart(url, username=None, password=None, use_cookies=False):
+    with get_driver_pool("undetected").lease() as driver:
+        load_browser_with_cookies(url, driver=driver)
+        print(f"🔄 Scraping hydrated page: {driver.current_url}")
+        return scrape_input_fields_after_login(driver)
+
+def suggest_validations_smart(url, username=None, password=None, use_cookies=False, return_driver=False):
     print(f"🧭 suggest_validations_smart: URL={url}, user={username}, cookie_mode={use_cookies}")
     
     if use_cookies:
-        return suggest_validations_with_bypass(url)
+        results = suggest_validations_with_bypass(url, username, password)
     elif username and password:
-        return suggest_validations_authenticated(url, username, password)
+        return suggest_validations_authenticated(url, username, password, return_driver=return_driver)
     else:
-        return suggest_validations(url)
+        results = suggest_validations(url)
+    return (results, None) if return_driver else results
 
 def suggest_validations(url=None, driver=None):
-    new_driver = False
     if driver is None:
-        options = Options()
-        options.add_argument("--headless=new")
-        driver = webdriver.Chrome(options=options)
-        new_driver = True
+        with get_driver_pool().lease() as pooled_driver:
+            return suggest_validations(url, driver=pooled_driver)
 
     if url:
         driver.get(url)
 
-    wait_for_js_hydration(driver)
-    results = scrape_input_fields_after_login(driver)
+    return scrape_input_fields_after_login(driver)
 
-    if new_driver:
-        driver.quit()
 
-    return results
 
 
+def apply_session_cookies(driver, url, cookies):
+    """Copy an authenticated session's cookies into this browser"""
+    parsed = urlparse(url)
+    set_browser_cookies(driver, cookies, f"{parsed.scheme}://{parsed.netloc}/")
+
+def _scrape_page_with_session(url, cookies, static=False):
+    if static:
+        # Browserless fast path; falls back to Selenium on redirects or when the served HTML has no controls
+        from static_scraper import suggest_validations_static
+        try:
+            results = suggest_validations_static(url, cookies=cookies)
+            if results:
+                return results
+            print(f"↩️ No interactive elements in static HTML of {url}, falling back to Selenium")
+        except Exception as e:
+            print(f"↩️ Static scrape failed for {url} ({e}), falling back to Selenium")
+
+    with get_driver_pool().lease() as driver:
+        if cookies:
+            apply_session_cookies(driver, url, cookies)
+        return suggest_validations(url, driver=driver)
+
+def scrape_pages_concurrently(urls, cookies=None, max_workers=SCRAPE_CONCURRENCY, static_urls=()):
+    """
+    Scrape several pages in parallel on pooled browsers that share the given session cookies.
+    Pages listed in `static_urls` are parsed from plain HTML first (see static_scraper.py).
+    Returns (url, results, error, elapsed_sec) tuples in the same order as `urls`; a failing
+    page only sets its own error and never aborts the others.
+    """
+    if not urls:
+        return []
+
+    def timed_scrape(url):
+        start = time.time()
+        return _scrape_page_with_session(url, cookies, static=url in static_urls), time.time() - start
+
+    outcomes = [None] * len(urls)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        futures = {executor.submit(timed_scrape, url): i for i, url in enumerate(urls)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results, elapsed = future.result()
+                outcomes[i] = (urls[i], results, None, elapsed)
+            except Exception as e:
+                print(f"❌ Failed scraping {urls[i]}: {e}")
+                outcomes[i] = (urls[i], [], e, 0.0)
+    return outcomes
 
 
 #To handle cloudflare issue name="cf-turnstile-response we need to do the following to bypass the login page and scrape the DOM for validations
@@ -324,4 +721,13 @@ def suggest_validations(url=None, driver=None):
 #Example: suggest_validations_authenticated("https://my.charitableimpact.com/some-page", "your_username", "your_password")
 #This will return a list of validations that can be used to generate the Java code for the page object model
 #Make sure to have the required packages installed:
-#pip install undetected-chromedriver selenium
\ No newline at end of file
+#pip install undetected-chromedriver selenium
+# Benchmark the bulk extraction against the per-element path on a local fixture:
+# python dom_scraper.py --benchmark 300
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 2 and sys.argv[1] == "--save-cookies":
+        save_cookies_after_manual_login(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+        benchmark_extraction_modes(element_count=count)
@@ -0,0 +1,220 @@
+# driver_pool.py
+import atexit
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException, WebDriverException
+import undetected_chromedriver as uc
+
+from config import DRIVER_POOL_SIZE, DRIVER_MAX_USES, DRIVER_LEASE_TIMEOUT
+
+
+def launch_headless_chrome():
+    options = Options()
+    options.add_argument("--headless=new")
+    return webdriver.Chrome(options=options)
+
+
+def launch_undetected_chrome():
+    options = uc.ChromeOptions()
+    return uc.Chrome(options=options, version_main=137)
+
+
+# This pool keeps a few browsers launched and hands them out with lease(), so a
+# prompt that scrapes several pages does not pay Chrome startup for each one.
+class DriverPool:
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES, factory=launch_headless_chrome, prewarm=True):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.factory = factory
+        self._idle = queue.Queue()
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._live = 0
+        self._closed = False
+        self.stats = {
+            "launches": 0,
+            "launch_failures": 0,
+            "recycled": 0,
+            "crashed": 0,
+            "timeouts": 0,
+            "leases": 0,
+            "total_wait_sec": 0.0,
+            "max_wait_sec": 0.0,
+        }
+        if prewarm:
+            for _ in range(self.size):
+                self._reserve_slot()
+                threading.Thread(target=self._launch_into_idle, daemon=True).start()
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._closed or self._live >= self.size:
+                return False
+            self._live += 1
+            return True
+
+    def _launch(self):
+        """Start a browser for an already reserved slot; frees the slot if launch fails"""
+        start = time.time()
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._lock:
+                self._live -= 1
+                self.stats["launch_failures"] += 1
+            raise
+        with self._lock:
+            self._uses[id(driver)] = 0
+            self.stats["launches"] += 1
+        print(f"🚀 Pool launched browser in {round(time.time() - start, 2)} sec")
+        return driver
+
+    def _launch_into_idle(self):
+        try:
+            self._idle.put(self._launch())
+        except Exception as e:
+            print(f"⚠️ Pool failed to pre-launch browser: {e}")
+
+    def _discard(self, driver, crashed=False):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+            self._live -= 1
+            self.stats["crashed" if crashed else "recycled"] += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        # Keep the pool warm by replacing the discarded browser in the background
+        if self._reserve_slot():
+            threading.Thread(target=self._launch_into_idle, daemon=True).start()
+
+    @staticmethod
+    def _reset(driver):
+        """Clear cookies and storage and park the browser on a blank page"""
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except WebDriverException:
+            pass  # about:blank and data: pages have no storage to clear
+        if hasattr(driver, "execute_cdp_cmd"):
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        else:
+            driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def acquire(self, timeout=DRIVER_LEASE_TIMEOUT):
+        """Take a warm browser, launching one if the pool has spare capacity, otherwise wait"""
+        if self._closed:
+            raise RuntimeError("❌ Driver pool has been shut down.")
+        start = time.time()
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve_slot():
+                driver = self._launch()
+            else:
+                try:
+                    driver = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"❌ No browser available from pool after {timeout} sec")
+        waited = time.time() - start
+        with self._lock:
+            self.stats["leases"] += 1
+            self.stats["total_wait_sec"] += waited
+            self.stats["max_wait_sec"] = max(self.stats["max_wait_sec"], waited)
+        return driver
+
+    def release(self, driver, crashed=False):
+        """Return a browser to the pool; recycle it after max_uses or when it has crashed"""
+        with self._lock:
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+        if self._closed:
+            self._discard(driver)
+            return
+        if crashed:
+            self._discard(driver, crashed=True)
+            return
+        try:
+            self._reset(driver)
+        except Exception as e:
+            print(f"⚠️ Browser reset failed, recycling: {e}")
+            self._discard(driver, crashed=True)
+            return
+        if self.max_uses and uses >= self.max_uses:
+            self._discard(driver)
+            return
+        self._idle.put(driver)
+
+    @contextmanager
+    def lease(self, timeout=DRIVER_LEASE_TIMEOUT):
+        driver = self.acquire(timeout=timeout)
+        crashed = False
+        try:
+            yield driver
+        except TimeoutException:
+            # A slow page is not a dead browser: release() resets it, and discards it only if that fails
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise
+        except WebDriverException:
+            crashed = True
+            raise
+        finally:
+            self.release(driver, crashed=crashed)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["live"] = self._live
+        stats["idle"] = self._idle.qsize()
+        stats["avg_wait_sec"] = round(stats["total_wait_sec"] / stats["leases"], 3) if stats["leases"] else 0.0
+        stats["total_wait_sec"] = round(stats["total_wait_sec"], 3)
+        stats["max_wait_sec"] = round(stats["max_wait_sec"], 3)
+        return stats
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            with self._lock:
+                self._live -= 1
+
+
+# Shared pools, one per browser flavour, reused across prompts and Streamlit sessions
+_POOL_FACTORIES = {
+    "headless": launch_headless_chrome,
+    "undetected": launch_undetected_chrome,
+}
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_driver_pool(kind="headless"):
+    with _pools_lock:
+        if kind not in _pools:
+            _pools[kind] = DriverPool(factory=_POOL_FACTORIES[kind])
+        return _pools[kind]
+
+
+def get_all_pool_stats():
+    with _pools_lock:
+        return {kind: pool.get_stats() for kind, pool in _pools.items()}
+
+
+@atexit.register
+def shutdown_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
@@ -0,0 +1,65 @@
+# element_ranker.py
+import re
+
+from config import ELEMENT_TOP_K
+
+# Sits between scraping and prompt building: keeps every form control plus the K
+# clickable elements most relevant to the user's prompt, so link-heavy pages don't
+# blow up the prompt. Both the cap and the scorer can be swapped per call.
+
+FORM_CONTROL_TYPES = {"textbox", "textarea", "dropdown", "checkbox", "radiobutton"}
+
+REGION_WEIGHTS = {
+    "dialog": 2.0,
+    "form": 2.0,
+    "main": 1.0,
+    "aside": 0.0,
+    "header": -1.0,
+    "nav": -1.5,
+    "footer": -2.0,
+}
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "then", "from", "into", "test", "tests",
+    "verify", "check", "page", "should", "when", "user", "click", "enter", "field", "button",
+}
+
+ACTION_WORDS = {"submit", "save", "login", "signin", "sign", "continue", "next", "confirm", "donate", "send", "create", "update", "delete"}
+
+
+def tokenize(text):
+    """Lowercase word tokens, splitting camelCase, snake_case and kebab-case"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+    return {t for t in re.split(r"[^a-zA-Z0-9]+", text.lower()) if len(t) >= 3}
+
+
+def default_scorer(el, prompt_tokens):
+    """Relevance of one element: prompt word overlap, page region and action-like names"""
+    element_tokens = tokenize(el.get("label", "")) | tokenize(el.get("name", ""))
+    if el.get("by") != "xpath":
+        element_tokens |= tokenize(el.get("selector", ""))
+    score = 3.0 * len(element_tokens & prompt_tokens)
+    score += REGION_WEIGHTS.get(el.get("region", ""), 0.0)
+    if element_tokens & ACTION_WORDS:
+        score += 1.0
+    if el.get("label", "").strip().lower() in ("", "unknown"):
+        score -= 1.0
+    return score
+
+
+def rank_elements(dom_elements, prompt, top_k=ELEMENT_TOP_K, scorer=default_scorer, keep_types=FORM_CONTROL_TYPES):
+    """
+    Keep all elements whose type is in keep_types plus the top_k highest scoring others.
+    Returns (kept, dropped); kept preserves the original page order.
+    """
+    prompt_tokens = tokenize(prompt) - STOPWORDS
+    always, candidates = [], []
+    for i, el in enumerate(dom_elements):
+        (always if el.get("type") in keep_types else candidates).append(i)
+
+    scored = sorted(candidates, key=lambda i: (-scorer(dom_elements[i], prompt_tokens), i))
+    keep = set(always) | set(scored[:top_k] if top_k is not None else scored)
+    kept = [el for i, el in enumerate(dom_elements) if i in keep]
+    dropped = [el for i, el in enumerate(dom_elements) if i not in keep]
+    print(f"🎯 Kept {len(kept)} of {len(dom_elements)} elements ({len(always)} form controls, top {top_k} others)")
+    return kept, dropped
@@ -0,0 +1,234 @@
+# help_crawler.py
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+
+from config import HELP_CRAWL_MAX_DEPTH, HELP_CRAWL_MAX_PAGES, HELP_CRAWL_WORKERS, HELP_CRAWL_RATE_PER_HOST
+
+# Breadth-first crawler for help sites, used by doc_ingestor for URL ingestion. Each depth
+# level is fetched by a bounded thread pool, requests to one host are spaced out by a
+# per-host rate limit, and responses are cached on disk with their ETag/Last-Modified so a
+# re-crawl sends conditional GETs and only transfers pages that changed.
+#
+#   python help_crawler.py https://help.example.com/     # crawl and report pages/sec
+#   python help_crawler.py --fixture                     # crawl a generated local site twice
+
+CACHE_DIR = "cache/help_pages"
+USER_AGENT = "ai-test-bot-help-crawler/1.0"
+
+
+class HostRateLimiter:
+    """At most `rate` requests per second per host, shared by all crawler threads"""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PageCache:
+    """Last response body and validators per URL, stored as cache/help_pages/<sha1>.json"""
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url):
+        try:
+            with open(self._path(url)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, url, html, etag=None, last_modified=None):
+        entry = {"url": url, "html": html, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}
+        tmp = self._path(url) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._path(url))
+
+
+class HelpCrawler:
+    def __init__(self, base_url, max_depth=HELP_CRAWL_MAX_DEPTH, max_pages=HELP_CRAWL_MAX_PAGES,
+                 workers=HELP_CRAWL_WORKERS, rate_per_host=HELP_CRAWL_RATE_PER_HOST, cache_dir=CACHE_DIR, timeout=10):
+        self.base_url = base_url
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.workers = workers
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(rate_per_host)
+        self.cache = PageCache(cache_dir)
+        self._local = threading.local()
+        parsed = urlparse(base_url)
+        self.host = parsed.netloc
+        # Stay inside the help section: same host, under the base URL's directory
+        self.path_prefix = parsed.path if parsed.path.endswith("/") else parsed.path.rsplit("/", 1)[0] + "/"
+        self.stats = {"pages": 0, "fetched": 0, "not_modified": 0, "errors": 0, "bytes": 0, "seconds": 0.0, "pages_per_sec": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _session(self):
+        # requests.Session isn't guaranteed thread-safe, so each worker keeps its own keep-alive session
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers["User-Agent"] = USER_AGENT
+        return self._local.session
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def in_scope(self, url):
+        parsed = urlparse(url)
+        return parsed.scheme in ("http", "https") and parsed.netloc == self.host and (parsed.path or "/").startswith(self.path_prefix)
+
+    def fetch(self, url):
+        """HTML for `url`, revalidating a cached copy with If-None-Match/If-Modified-Since; None on failure"""
+        cached = self.cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        self.rate_limiter.wait(urlparse(url).netloc)
+        try:
+            response = self._session().get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached:
+                self._count(not_modified=1)
+                return cached["html"]
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"⚠️ Failed to fetch {url}: {e}")
+            self._count(errors=1)
+            return cached["html"] if cached else None
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return None
+        self.cache.put(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        self._count(fetched=1, bytes=len(response.content))
+        return response.text
+
+    def extract_links(self, url, html):
+        soup = BeautifulSoup(html, "html.parser")
+        links = []
+        for a_tag in soup.find_all("a", href=True):
+            link = urldefrag(urljoin(url, a_tag["href"]))[0]
+            if self.in_scope(link):
+                links.append(link)
+        return links
+
+    def crawl(self):
+        """Breadth-first crawl from base_url; returns [{"url", "html", "depth"}] in discovery order"""
+        start = time.time()
+        start_url = urldefrag(self.base_url)[0]
+        seen = {start_url}
+        frontier = [start_url]
+        pages = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for depth in range(self.max_depth + 1):
+                if not frontier:
+                    break
+                frontier = frontier[:self.max_pages - len(pages)]
+                next_frontier = []
+                for url, html in zip(frontier, pool.map(self.fetch, frontier)):
+                    if html is None:
+                        continue
+                    pages.append({"url": url, "html": html, "depth": depth})
+                    if depth < self.max_depth:
+                        for link in self.extract_links(url, html):
+                            if link not in seen:
+                                seen.add(link)
+                                next_frontier.append(link)
+                if len(pages) >= self.max_pages:
+                    break
+                frontier = next_frontier
+
+        seconds = time.time() - start
+        self.stats.update(pages=len(pages), seconds=round(seconds, 2), pages_per_sec=round(len(pages) / seconds, 2) if seconds else 0.0)
+        print(f"🕸️ Crawled {len(pages)} pages from {self.base_url} in {self.stats['seconds']} sec "
+              f"({self.stats['pages_per_sec']} pages/sec, {self.stats['not_modified']} unchanged, {self.stats['errors']} errors)")
+        return pages
+
+
+def pages_to_documents(pages):
+    """Yield page text as LangChain Documents (same page_content/source as WebBaseLoader produced)"""
+    from langchain.schema import Document
+    for page in pages:
+        soup = BeautifulSoup(page["html"], "html.parser")
+        title = soup.title.get_text(strip=True) if soup.title else ""
+        yield Document(page_content=soup.get_text(), metadata={"source": page["url"], "title": title})
+
+
+def _build_fixture_site(root, sections=5, pages_per_section=8):
+    """Small linked help site: index -> sections -> articles, with some cross links and an off-site link"""
+    links = [f'<a href="section{s}/index.html">Section {s}</a>' for s in range(sections)]
+    with open(os.path.join(root, "index.html"), "w") as f:
+        f.write(f"<html><head><title>Help</title></head><body>{''.join(links)}<a href='https://example.com/'>x</a></body></html>")
+    for s in range(sections):
+        os.makedirs(os.path.join(root, f"section{s}"), exist_ok=True)
+        articles = [f'<a href="article{p}.html#top">Article {p}</a>' for p in range(pages_per_section)]
+        with open(os.path.join(root, f"section{s}", "index.html"), "w") as f:
+            f.write(f"<html><head><title>Section {s}</title></head><body>{''.join(articles)}</body></html>")
+        for p in range(pages_per_section):
+            with open(os.path.join(root, f"section{s}", f"article{p}.html"), "w") as f:
+                f.write(f"<html><head><title>Article {s}.{p}</title></head><body><p>How to use feature {s}.{p}.</p>"
+                        f"<a href='../section{(s + 1) % sections}/article{p}.html'>Related</a></body></html>")
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Crawl a help site and report pages/sec")
+    parser.add_argument("url", nargs="?")
+    parser.add_argument("--fixture", action="store_true", help="serve a generated site with http.server and crawl it twice")
+    parser.add_argument("--depth", type=int, default=HELP_CRAWL_MAX_DEPTH)
+    parser.add_argument("--workers", type=int, default=HELP_CRAWL_WORKERS)
+    parser.add_argument("--rate", type=float, default=HELP_CRAWL_RATE_PER_HOST, help="requests/sec per host")
+    args = parser.parse_args()
+
+    if args.fixture:
+        from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+        site_dir = tempfile.mkdtemp(prefix="help_site_")
+        _build_fixture_site(site_dir)
+
+        class FixtureHandler(SimpleHTTPRequestHandler):
+            # SimpleHTTPRequestHandler sends Last-Modified and answers If-Modified-Since with 304
+            def __init__(self, *handler_args, **kwargs):
+                super().__init__(*handler_args, directory=site_dir, **kwargs)
+
+            def log_message(self, format, *log_args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/index.html"
+        cache_dir = tempfile.mkdtemp(prefix="help_cache_")
+        for run in ("cold", "warm"):
+            crawler = HelpCrawler(url, args.depth, workers=args.workers, rate_per_host=args.rate, cache_dir=cache_dir)
+            crawler.crawl()
+            print(f"   {run}: {crawler.stats}")
+        server.shutdown()
+    elif args.url:
+        crawler = HelpCrawler(args.url, args.depth, workers=args.workers, rate_per_host=args.rate)
+        crawler.crawl()
+        print(crawler.stats)
+    else:
+        parser.error("pass a URL or --fixture")
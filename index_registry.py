@@ -0,0 +1,128 @@
+# index_registry.py
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from config import RAG_VERSIONS_DIR, RAG_KEEP_VERSIONS
+
+# Versioned FAISS index store. Each ingestion builds into a private staging directory, is
+# renamed into rag_versions/<version>/ once complete, and is then published by atomically
+# replacing the CURRENT pointer file, so readers only ever see a fully written index.
+# The last RAG_KEEP_VERSIONS versions are kept for rollback.
+#
+#   python index_registry.py                 # list versions
+#   python index_registry.py rollback <id>   # point CURRENT at an older version
+
+POINTER_FILE = "CURRENT"
+METADATA_FILE = "metadata.json"
+STAGING_PREFIX = ".staging-"
+
+
+class IndexRegistry:
+    def __init__(self, root=RAG_VERSIONS_DIR, keep=RAG_KEEP_VERSIONS):
+        self.root = root
+        self.keep = keep
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def new_staging(self):
+        """Empty directory to build a new index in; pass it to publish() when complete"""
+        path = os.path.join(self.root, f"{STAGING_PREFIX}{uuid.uuid4().hex[:8]}")
+        os.makedirs(path)
+        return path
+
+    def discard(self, staging_path):
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+    def publish(self, staging_path, metadata):
+        """Move a finished staging build into place, make it current and prune old versions"""
+        with self._lock:
+            version = datetime.now().strftime("rag_%Y%m%d_%H%M%S")
+            if os.path.exists(os.path.join(self.root, version)):
+                version += f"_{uuid.uuid4().hex[:4]}"
+            metadata = dict(metadata, version=version, built_at=time.time())
+            self._write_json(os.path.join(staging_path, METADATA_FILE), metadata)
+            os.replace(staging_path, os.path.join(self.root, version))
+            self._set_current(version)
+            pruned = self.prune()
+        print(f"📦 Published index {version} ({metadata.get('chunks')} chunks){f', pruned {pruned}' if pruned else ''}")
+        return version
+
+    def rollback(self, version):
+        if not os.path.exists(os.path.join(self.root, version, "index.faiss")):
+            raise ValueError(f"Unknown index version: {version}")
+        with self._lock:
+            self._set_current(version)
+        print(f"⏪ Current index is now {version}")
+        return version
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, POINTER_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_path(self):
+        """Directory of the current version, or None if nothing has been published"""
+        version = self.current_version()
+        return os.path.join(self.root, version) if version else None
+
+    def list_versions(self):
+        """Metadata of every stored version, newest first"""
+        current = self.current_version()
+        versions = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(STAGING_PREFIX) or not os.path.exists(os.path.join(path, "index.faiss")):
+                continue
+            metadata = self.get_metadata(name)
+            metadata.setdefault("version", name)
+            metadata.setdefault("built_at", os.path.getmtime(os.path.join(path, "index.faiss")))
+            metadata["current"] = name == current
+            versions.append(metadata)
+        return sorted(versions, key=lambda m: m["built_at"], reverse=True)
+
+    def get_metadata(self, version):
+        try:
+            with open(os.path.join(self.root, version, METADATA_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def prune(self):
+        """Delete all but the newest `keep` versions (never the current one); caller holds the lock"""
+        current = self.current_version()
+        stale = [m["version"] for m in self.list_versions()[self.keep:] if m["version"] != current]
+        for version in stale:
+            # Readers hold the loaded index in memory, so removing its files is safe
+            shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+        return stale
+
+    def _set_current(self, version):
+        tmp = os.path.join(self.root, f"{POINTER_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp, "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.root, POINTER_FILE))
+
+    def _write_json(self, path, data):
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+
+index_registry = IndexRegistry()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 2 and sys.argv[1] == "rollback":
+        index_registry.rollback(sys.argv[2])
+    for meta in index_registry.list_versions():
+        built = datetime.fromtimestamp(meta["built_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{'*' if meta['current'] else ' '} {meta['version']}  {built}  {meta.get('chunks', '?')} chunks  {meta.get('source', '')}")
@@ -1,15 +1,32 @@
 # llm_engine.py
 import os
-import openai
+import re
 from dotenv import load_dotenv
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-from rag_search import retrieve_context
+from transformers import AutoModelForCausalLM, AutoTokenizer, LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList, TextStreamer
+from transformers.generation.streamers import BaseStreamer
 import torch
+import threading
+import queue
 import warnings
-import streamlit as st
 import time
+import json
+import subprocess
+import sys
+import copy
+import gc
+from collections import OrderedDict, deque
 from datetime import datetime
 
+try:
+    import tiktoken
+except ImportError:  # optional: OpenAI token counts then fall back to a chars/4 estimate
+    tiktoken = None
+
+from config import LOCAL_PRECISION, LOCAL_PRECISION_MODES, KV_PREFIX_CACHE, LOCAL_BATCHING, BATCH_WINDOW_MS, BATCH_MAX_SIZE
+from config import OPENAI_BASE_URL, OPENAI_MAX_CONCURRENCY
+from config import MODEL_RAM_BUDGET_MB
+from config import EARLY_STOP_CLASS_BLOCKS, MAX_NEW_TOKENS_BASE, MAX_NEW_TOKENS_PER_ELEMENT, MAX_NEW_TOKENS_CAP
+
 warnings.filterwarnings("ignore")
 
 load_dotenv()
@@ -18,6 +35,14 @@ os.environ["USER_AGENT"] = "CharitableImpact-TestGenBot/1.0"
 # Load OpenAI API key from environment variable
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL_NAME = "gpt-3.5-turbo"
+DEFAULT_MAX_NEW_TOKENS = 512
+
+# A "=== PAGE OBJECT CLASS: Name ===" / "=== TEST CLASS: Name ===" header followed by a closed
+# ```java fence, the output format RESTRICTION_PROMPT.txt asks for (parsed by code_generator)
+CLASS_BLOCK_PATTERN = re.compile(
+    r"(?i)==+\s*(page|test)\s*(?:object\s*)?class\s*:\s*([a-zA-Z0-9_]+)\s*==+\s*```(?:java)?\s*\n(.*?)```",
+    re.DOTALL,
+)
 
 # Global state
 # Load restriction prompt from external file
@@ -27,62 +52,324 @@ if not os.path.exists(RESTRICTION_PROMPT_PATH):
 
 with open(RESTRICTION_PROMPT_PATH, "r", encoding="utf-8") as file:
     RESTRICTION_PROMPT = file.read().strip()
+restriction_prompt_mtime = os.path.getmtime(RESTRICTION_PROMPT_PATH)
 
 local_tokenizer = None
 local_model = None
-local_chatbot_pipeline = None
+local_model_name = None
+local_precision = None
+local_model_stats = {}
 openai_client = None
+model_host_client = None
+host_model_name = None
+telemetry = None
 llm_mode = "local"
 
+class ModelRegistry:
+    """
+    Loaded local models keyed by (model name, precision). Switching back to a model that is
+    still cached is instant; once the resident weights exceed budget_mb the least recently
+    used models are evicted. Concurrent requests for the same model share one load.
+    """
+    def __init__(self, budget_mb=MODEL_RAM_BUDGET_MB, max_events=50):
+        self.budget_mb = budget_mb
+        self._models = OrderedDict()
+        self._loading = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self.events = deque(maxlen=max_events)
+
+    def get(self, model_name, precision):
+        """Return {"model", "tokenizer", "stats"} for the model, loading (and evicting) if needed"""
+        key = (model_name, precision)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self._models[key]["stats"]["last_used"] = time.time()
+                return self._models[key]
+            event = self._loading.get(key)
+            owner = event is None
+            if owner:
+                event = self._loading[key] = threading.Event()
+                self._errors.pop(key, None)
+        if not owner:
+            event.wait()
+            with self._lock:
+                if key not in self._models:
+                    raise RuntimeError(self._errors.get(key, f"Loading {model_name} failed"))
+                return self._models[key]
+
+        try:
+            entry = self._load(model_name, precision)
+            with self._lock:
+                self._models[key] = entry
+                self._evict(keep=key)
+            return entry
+        except Exception as e:
+            self._errors[key] = str(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def preload(self, model_name, precision):
+        """Load in a background thread (no-op if already loaded or loading)"""
+        key = (model_name, precision)
+        with self._lock:
+            if key in self._models or key in self._loading:
+                return
+
+        def run():
+            try:
+                self.get(model_name, precision)
+            except Exception as e:
+                print(f"❌ Background preload of {model_name} failed: {e}")
+
+        threading.Thread(target=run, daemon=True, name=f"preload-{model_name}").start()
+        print(f"🧠 Preloading {model_name} ({precision}) in the background")
+
+    def _load(self, model_name, precision):
+        if precision not in LOCAL_PRECISION_MODES:
+            raise ValueError(f"Unknown precision mode '{precision}', expected one of {LOCAL_PRECISION_MODES}")
+        print(f"🧠 Loading local model: {model_name} ({precision})")
+        rss_before = _rss_mb()
+        start = time.time()
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        # ✅ Fix: disable meta tensors and allow CPU-based loading
+        device = "cpu"
+        # int8 quantizes a float32 model after loading; bfloat16 halves the weights directly
+        torch_dtype = torch.bfloat16 if precision == "bfloat16" else torch.float32
+        load_kwargs = {"torch_dtype": torch_dtype, "device_map": {"": device}, "low_cpu_mem_usage": True}
+        try:
+            # safetensors weights are memory-mapped instead of unpickled into a second copy
+            model = AutoModelForCausalLM.from_pretrained(model_name, use_safetensors=True, **load_kwargs)
+        except (OSError, EnvironmentError):
+            print(f"⚠️ No safetensors weights for {model_name}, loading the PyTorch checkpoint")
+            model = AutoModelForCausalLM.from_pretrained(model_name, **load_kwargs)
+
+        if precision == "int8":
+            # Dynamic quantization: int8 weights for every nn.Linear, activations quantized per batch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        model.eval()
+        stats = {
+            "model": model_name,
+            "precision": precision,
+            "load_seconds": round(time.time() - start, 2),
+            "size_mb": _model_size_mb(model),
+            "model_rss_mb": round(_rss_mb() - rss_before, 1),
+            "rss_mb": _rss_mb(),
+            "peak_rss_mb": _peak_rss_mb(),
+            "last_used": time.time(),
+        }
+        stats.update(_warmup_latency(model, tokenizer))
+        self.events.append({"time": time.time(), "event": "load", "model": model_name, "precision": precision,
+                            "seconds": stats["load_seconds"], "size_mb": stats["size_mb"]})
+        print(f"✅ Loaded {model_name} ({precision}) in {stats['load_seconds']} sec, {stats['size_mb']} MB")
+        return {"model": model, "tokenizer": tokenizer, "stats": stats}
+
+    def _evict(self, keep):
+        """Drop least recently used models (never `keep`) until the total fits the budget; caller holds the lock"""
+        while self._total_mb() > self.budget_mb:
+            # The model currently serving requests stays even if that leaves the cache over budget
+            candidates = [k for k in self._models if k != keep and self._models[k]["model"] is not local_model]
+            if not candidates:
+                break
+            key = candidates[0]
+            entry = self._models.pop(key)
+            self.events.append({"time": time.time(), "event": "evict", "model": key[0], "precision": key[1],
+                                "size_mb": entry["stats"]["size_mb"]})
+            print(f"♻️ Evicted {key[0]} ({key[1]}, {entry['stats']['size_mb']} MB) to stay under {self.budget_mb} MB")
+            del entry
+        gc.collect()
+
+    def _total_mb(self):
+        return round(sum(entry["stats"]["size_mb"] for entry in self._models.values()), 1)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "budget_mb": self.budget_mb,
+                "resident_mb": self._total_mb(),
+                "models": [
+                    {k: entry["stats"][k] for k in ("model", "precision", "size_mb", "load_seconds", "last_used")}
+                    for entry in reversed(self._models.values())
+                ],
+                "loading": [f"{name} ({precision})" for name, precision in self._loading],
+                "evictions": sum(e["event"] == "evict" for e in self.events),
+                "events": list(self.events)[-10:],
+            }
+
+
+model_registry = ModelRegistry()
+
+
 # Initialize local model and tokenizer
 # This will be called at startup to preload the default local model
 # and tokenizer to avoid delays during user interactions.
 # It will also handle the case where the local model fails to load.
 # If the local model fails, it will fall back to OpenAI mode if available.
-def initialize_local_model(model_name="TinyLlama/TinyLlama-1.1B-Chat-v1.0"):
+# Models stay cached in model_registry, so switching back to one is instant.
+def initialize_local_model(model_name="TinyLlama/TinyLlama-1.1B-Chat-v1.0", precision=LOCAL_PRECISION):
     current_datetime = datetime.now()
     current_time = current_datetime.strftime("%H:%M:%S")
     print(f"🔁 initialize_local_model called at {current_time}")
-    print(f"Model name received in initialize_local_model.{model_name}")
-    global local_tokenizer, local_model, local_chatbot_pipeline
+    print(f"Model name received in initialize_local_model.{model_name} ({precision})")
     try:
-        #model_id = st.session_state.get("local_model_name", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
-        #model_id = st.session_state.get("local_model_name", "mistralai/Mistral-7B-Instruct-v0.2")
-        #model_id = st.session_state.get("local_model_name", "teknium/OpenHermes-2.5-Mistral-7B")
-        model_id = st.session_state.get("local_model_name", model_name) # Use provided model_name or fallback to session state
-        print(f"🧠 Loading local model: {model_id}")
-
-        local_tokenizer = AutoTokenizer.from_pretrained(model_id)
-
-        # ✅ Fix: disable meta tensors and allow CPU-based loading
-        device = "cpu"
-        torch_dtype = torch.float32
-        local_model = AutoModelForCausalLM.from_pretrained(
-        model_id,
-        torch_dtype=torch_dtype,
-        device_map={"": device}
-        )
-
-
-        local_chatbot_pipeline = pipeline(
-            "text-generation",
-            model=local_model,
-            tokenizer=local_tokenizer,
-            max_new_tokens=512,
-            do_sample=True,
-            temperature=0.7,
-            top_p=0.95
-        )
-
-        print("✅ Local model loaded successfully.")
+        # The caller (app sidebar or model_host) passes the selected model explicitly, so this
+        # module no longer reads Streamlit session state and can run outside the UI process.
+        start = time.time()
+        entry = model_registry.get(model_name, precision)
+        activate_local_model(model_name, precision, entry, switch_seconds=round(time.time() - start, 2))
         current_datetime = datetime.now()
         current_time = current_datetime.strftime("%H:%M:%S")
-        print(f"✅ Local model loaded successfully. {current_time} ")
+        print(f"✅ Local model ready: {model_name} ({precision}) in {local_model_stats['switch_seconds']} sec. {current_time}")
         return True
 
     except Exception as e:
         print(f"❌ Failed to load local model: {e}")
         return False
+
+
+def activate_local_model(model_name, precision, entry, switch_seconds=0.0):
+    """Make a model_registry entry the one local generation uses"""
+    global local_tokenizer, local_model, local_model_name, local_precision, local_model_stats
+    if entry["model"] is not local_model:
+        prefix_cache.clear()
+    local_model = entry["model"]
+    local_tokenizer = entry["tokenizer"]
+    local_model_name = model_name
+    local_precision = precision
+    local_model_stats = dict(entry["stats"], switch_seconds=switch_seconds)
+
+
+def preload_local_model(model_name="TinyLlama/TinyLlama-1.1B-Chat-v1.0", precision=LOCAL_PRECISION):
+    """Start loading a model in the background so the first initialize_local_model() finds it cached"""
+    model_registry.preload(model_name, precision)
+
+
+def _model_size_mb(model):
+    """Bytes held by the model's weights and buffers, including int8 packed Linear weights"""
+    total = 0
+    for value in model.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return round(total / 2**20, 1)
+
+
+def _rss_mb():
+    """Current resident set size of this process (falls back to the peak where /proc is missing)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _warmup_latency(model, tokenizer, new_tokens=16):
+    """Greedy-generate a few tokens right after load to report per-token latency (and warm the kernels)"""
+    inputs = tokenizer("Hello", return_tensors="pt").to(model.device)
+    start = time.time()
+    with torch.no_grad():
+        output_ids = model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens, do_sample=False)
+    generated = output_ids.shape[1] - inputs["input_ids"].shape[1]
+    elapsed = time.time() - start
+    return {
+        "warmup_ms_per_token": round(1000 * elapsed / max(generated, 1), 1),
+        "warmup_tokens_per_sec": round(generated / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def get_local_model_stats():
+    stats = dict(local_model_stats)
+    if stats:
+        stats["prefix_cache"] = prefix_cache.get_stats()
+        stats["batching"] = batch_scheduler.get_stats()
+    stats["registry"] = model_registry.get_stats()
+    return stats
+
+
+# Compare precision modes on one model. Each mode loads in a fresh subprocess so peak RSS
+# is measured per mode instead of accumulating across loads in this process.
+def benchmark_precision_modes(model_name="TinyLlama/TinyLlama-1.1B-Chat-v1.0", modes=LOCAL_PRECISION_MODES, max_new_tokens=64):
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for mode in modes:
+        print(f"⏱️ Benchmarking {model_name} in {mode}...")
+        proc = subprocess.run(
+            [sys.executable, os.path.join(here, "llm_engine.py"), "--measure", model_name, mode, str(max_new_tokens)],
+            cwd=here, capture_output=True, text=True,
+        )
+        lines = proc.stdout.strip().splitlines()
+        try:
+            results.append(json.loads(lines[-1]))
+        except (IndexError, json.JSONDecodeError):
+            results.append({"precision": mode, "error": (proc.stderr or proc.stdout).strip()[-500:]})
+
+    print(f"{'mode':<10}{'load s':>9}{'tok/s':>9}{'ttft s':>9}{'peak RSS MB':>13}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['precision']:<10} failed: {r['error']}")
+        else:
+            print(f"{r['precision']:<10}{r['load_seconds']:>9}{r['tokens_per_sec']:>9}{r['ttft']:>9}{r['peak_rss_mb']:>13}")
+    return results
+
+
+# Time-to-first-token on the loaded model with and without the restriction-prompt KV cache
+def benchmark_prefix_cache(runs=3):
+    messages = with_restriction_prompt([{"role": "user", "content": "Generate a TestNG test for the login page."}])
+    inputs = local_tokenizer(format_local_prompt(messages), return_tensors="pt").to(local_model.device)
+    results = {}
+    for use_cache in (False, True):
+        ttfts = []
+        for _ in range(runs):
+            past_key_values, cached = prefix_cache.lookup(inputs["input_ids"]) if use_cache else (None, 0)
+            timer = FirstTokenTimer()
+            start = time.time()
+            with torch.no_grad():
+                local_model.generate(**inputs, max_new_tokens=1, do_sample=False, past_key_values=past_key_values,
+                                     logits_processor=LogitsProcessorList([timer]))
+            ttfts.append(timer.first_token_at - start)
+        label = "prefix cache" if use_cache else "no cache"
+        results[label] = round(1000 * sorted(ttfts)[len(ttfts) // 2], 1)
+        print(f"⏱️ {label}: median prefill {results[label]} ms over {runs} runs ({inputs['input_ids'].shape[1]} prompt tokens, {cached} cached)")
+    return results
+
+
+def _measure_precision(model_name, precision, max_new_tokens):
+    """Benchmark child: load one mode, time a fixed greedy generation, print stats as JSON"""
+    if not initialize_local_model(model_name, precision):
+        raise SystemExit(1)
+    messages = [{"role": "user", "content": "Write a Selenium Page Object in Java for a login page with email, password and a submit button."}]
+    inputs = local_tokenizer(format_local_prompt(messages), return_tensors="pt")
+    timer = FirstTokenTimer()
+    start = time.time()
+    with torch.no_grad():
+        output_ids = local_model.generate(
+            **inputs, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens, do_sample=False,
+            logits_processor=LogitsProcessorList([timer]),
+        )
+    generated = output_ids.shape[1] - inputs["input_ids"].shape[1]
+    stats = add_speed_metrics({}, start, timer.first_token_at, time.time(), generated)
+    stats.update({k: local_model_stats[k] for k in ("precision", "load_seconds", "model_rss_mb")})
+    stats["peak_rss_mb"] = _peak_rss_mb()
+    print(json.dumps(stats))
+
     
 # Initialize OpenAI client
 # This will be called when switching to OpenAI mode or at startup if OpenAI mode is selected.
@@ -96,12 +383,16 @@ def initialize_local_model(model_name="TinyLlama/TinyLlama-1.1B-Chat-v1.0"):
 # If the OpenAI API key is not set, it will print an error message and return
 def initialize_openai_client():
     global openai_client
-    if not OPENAI_API_KEY:
+    if not OPENAI_API_KEY and not OPENAI_BASE_URL:
         print("❌ OPENAI_API_KEY is missing.")
         return False
+    if openai_client is not None:
+        return True
     try:
-        openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        print("✅ OpenAI client initialized.")
+        # Shared async client: pooled connections, bounded concurrency, retries with backoff
+        from openai_client import AsyncOpenAIPool
+        openai_client = AsyncOpenAIPool(api_key=OPENAI_API_KEY or "stub-key")
+        print(f"✅ OpenAI client initialized{' (' + OPENAI_BASE_URL + ')' if OPENAI_BASE_URL else ''}.")
         return True
     except Exception as e:
         print(f"❌ OpenAI client initialization failed: {e}")
@@ -112,6 +403,36 @@ def initialize_openai_client():
 #initialize_local_model()use this only when you want to # set the default local model at startup, otherwise use set_llm_mode("local") to switch modes dynamically
 
 
+# Route local-model requests to the long-lived model_host process instead of loading the
+# model into this (Streamlit) process. Loading happens in the background on the host, so
+# this returns immediately; poll get_model_host_status() to show progress.
+def use_model_host(model_name="TinyLlama/TinyLlama-1.1B-Chat-v1.0", precision=LOCAL_PRECISION):
+    global model_host_client, llm_mode, host_model_name
+    from model_host import ModelHostClient
+    try:
+        if model_host_client is None:
+            model_host_client = ModelHostClient()
+        model_host_client.ensure_running()
+        model_host_client.load_model(model_name, precision)
+        host_model_name = model_name
+        llm_mode = "host"
+        print(f"🔁 LLM mode set to: host ({model_name}, {precision})")
+        return True
+    except Exception as e:
+        print(f"❌ Model host unavailable: {e}")
+        llm_mode = None
+        return False
+
+
+def get_model_host_status():
+    if model_host_client is None:
+        return {"state": "stopped", "model": None}
+    try:
+        return model_host_client.status()
+    except Exception as e:
+        return {"state": "unreachable", "model": None, "error": str(e)}
+
+
 def set_llm_mode(mode: str):
     global llm_mode
     if mode == "openai":
@@ -128,72 +449,584 @@ def set_llm_mode(mode: str):
         llm_mode = None
     print(f"🔁 LLM mode set to: {llm_mode}")
 
-# Function to handle chat interactions with the LLM
-def chat_with_llm(prompt_messages: list, temperature=0.7, return_usage=False) -> tuple:
-    start_time = time.time()
-    print(f"🔍 chat_with_llm called with mode: {llm_mode}")
+def format_local_prompt(prompt_messages: list, tokenizer=None) -> str:
+    tokenizer = tokenizer or local_tokenizer
+    if hasattr(tokenizer, "chat_template") and tokenizer.chat_template:
+        return tokenizer.apply_chat_template(
+            prompt_messages, tokenize=False, add_generation_prompt=True
+        )
+    print("⚠️ chat_template not supported, falling back to raw prompt merge")
+    return prompt_messages[0]["content"] + "\n\nUser: " + prompt_messages[-1]["content"]
+
+
+class FirstTokenTimer(LogitsProcessor):
+    """Records when generate() finishes the prefill and is about to pick the first new token"""
+    def __init__(self):
+        self.first_token_at = None
+
+    def __call__(self, input_ids, scores):
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        return scores
+
+
+class ClassBlocksStoppingCriteria(StoppingCriteria):
+    """
+    Stops each row of a generate() call once its output holds a closed fenced block for
+    both a PAGE and a TEST class, instead of letting the model ramble to max_new_tokens.
+    """
+    def __init__(self, tokenizer, prompt_length, required=("page", "test")):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.required = set(required)
+        self.done = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.done is None:
+            self.done = [False] * input_ids.shape[0]
+        for row in range(input_ids.shape[0]):
+            if self.done[row]:
+                continue
+            # A block can only have closed if a backtick was just produced
+            if "`" not in self.tokenizer.decode(input_ids[row, -3:], skip_special_tokens=True):
+                continue
+            text = self.tokenizer.decode(input_ids[row, self.prompt_length:], skip_special_tokens=True)
+            found = {match.group(1).lower() for match in CLASS_BLOCK_PATTERN.finditer(text)}
+            self.done[row] = self.required <= found
+        return torch.tensor(self.done, dtype=torch.bool, device=input_ids.device)
+
+    def stopped(self, row=0):
+        return bool(self.done and self.done[row])
+
+
+class RowLengthStoppingCriteria(StoppingCriteria):
+    """Per-row max_new_tokens for a batched generate() whose rows asked for different reply budgets"""
+    def __init__(self, prompt_length, limits):
+        self.prompt_length = prompt_length
+        self.limits = limits
+
+    def __call__(self, input_ids, scores, **kwargs):
+        generated = input_ids.shape[1] - self.prompt_length
+        return torch.tensor([generated >= limit for limit in self.limits], dtype=torch.bool, device=input_ids.device)
+
+
+def estimate_max_new_tokens(n_elements):
+    """Reply budget for a Page Object + test over n_elements DOM elements (field, action and test step each)"""
+    return min(MAX_NEW_TOKENS_CAP, MAX_NEW_TOKENS_BASE + MAX_NEW_TOKENS_PER_ELEMENT * n_elements)
+
+
+class CallbackStreamer(TextStreamer):
+    """TextStreamer that hands each finalized piece of text to a callback instead of printing it"""
+    def __init__(self, tokenizer, callback):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.callback = callback
+
+    def on_finalized_text(self, text, stream_end=False):
+        if text:
+            self.callback(text)
+
+
+class BatchRowStreamer(BaseStreamer):
+    """Streamer for a batched generate(): sends each row's newly decoded text to that row's callback"""
+    def __init__(self, tokenizer, callbacks, eos_token_ids):
+        self.tokenizer = tokenizer
+        self.callbacks = callbacks
+        self.eos_token_ids = set(eos_token_ids)
+        self.rows = [[] for _ in callbacks]
+        self.sent = [0] * len(callbacks)
+        self.finished = [False] * len(callbacks)
+        self.prompt_seen = False
+
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True  # the first call carries the (padded) prompts
+            return
+        for i, token in enumerate(value.reshape(-1).tolist()):
+            if self.finished[i]:
+                continue
+            if token in self.eos_token_ids:
+                self.finished[i] = True
+                continue
+            self.rows[i].append(token)
+            text = self.tokenizer.decode(self.rows[i], skip_special_tokens=True)
+            if self.callbacks[i] and len(text) > self.sent[i] and not text.endswith("\ufffd"):
+                self.callbacks[i](text[self.sent[i]:])
+                self.sent[i] = len(text)
+
+    def end(self):
+        pass
+
+
+def add_speed_metrics(usage, start, first_token_at, end, generated_tokens):
+    """Add time-to-first-token and decode tokens/sec to a usage dict"""
+    usage["ttft"] = round(first_token_at - start, 3) if first_token_at else None
+    decode_seconds = end - (first_token_at or start)
+    usage["decode_seconds"] = round(decode_seconds, 3)
+    usage["tokens_per_sec"] = round(generated_tokens / decode_seconds, 2) if decode_seconds > 0 and generated_tokens else 0.0
+    return usage
 
-    # Inject restriction prompt only if not already present
-    #if not any(RESTRICTION_PROMPT.strip() in m["content"] for m in prompt_messages if m["role"] == "system"):
-    prompt_messages = [{"role": "system", "content": RESTRICTION_PROMPT}] + [
-        m for m in prompt_messages if m["role"] != "system"]
 
+class PrefixKVCache:
+    """
+    Attention key/values of the constant prompt prefix (chat-template preamble + restriction
+    prompt) for the loaded model. Built once and deep-copied into every generate() call so
+    only the request-specific tokens are prefilled. Rebuilt when the model, its precision or
+    RESTRICTION_PROMPT.txt changes.
+    """
+    def __init__(self, min_tokens=16):
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.key = None
+        self.token_ids = []
+        self.past_key_values = None
+        self.build_ms = None
+        self.hits = 0
+        self.misses = 0
+
+    def _prefix_text(self, restriction_prompt):
+        system = [{"role": "system", "content": restriction_prompt}]
+        if getattr(local_tokenizer, "chat_template", None):
+            try:
+                return local_tokenizer.apply_chat_template(system, tokenize=False, add_generation_prompt=False)
+            except Exception:
+                pass  # template without a system role (e.g. gemma); the common-prefix match below still applies
+        return restriction_prompt
+
+    def _build(self, restriction_prompt):
+        ids = local_tokenizer(self._prefix_text(restriction_prompt), return_tensors="pt")["input_ids"].to(local_model.device)
+        start = time.time()
+        with torch.no_grad():
+            self.past_key_values = local_model(input_ids=ids, use_cache=True).past_key_values
+        self.build_ms = round(1000 * (time.time() - start), 1)
+        self.token_ids = ids[0].tolist()
+        print(f"🧊 Cached KV for {len(self.token_ids)} prefix tokens in {self.build_ms} ms")
+
+    def lookup(self, input_ids):
+        """Return (copy of the cached past_key_values or None, number of prompt tokens it covers)"""
+        restriction_prompt = get_restriction_prompt()
+        key = (local_model_name, local_precision, id(local_model), restriction_prompt_mtime)
+        ids = input_ids[0].tolist()
+        with self._lock:
+            if key != self.key:
+                self._build(restriction_prompt)
+                self.key = key
+            # At least one prompt token must be left for generate() to prefill
+            limit = min(len(self.token_ids), len(ids) - 1)
+            n = 0
+            while n < limit and ids[n] == self.token_ids[n]:
+                n += 1
+            if n < self.min_tokens or (n < len(self.token_ids) and not hasattr(self.past_key_values, "crop")):
+                self.misses += 1
+                return None, 0
+            past_key_values = copy.deepcopy(self.past_key_values)
+            self.hits += 1
+        if n < len(self.token_ids):
+            past_key_values.crop(n)
+        return past_key_values, n
+
+    def get_stats(self):
+        return {"prefix_tokens": len(self.token_ids), "build_ms": self.build_ms, "hits": self.hits, "misses": self.misses}
+
+
+prefix_cache = PrefixKVCache()
+
+
+# Run the loaded local model on already restriction-prefixed messages.
+# Returns (response, usage) and raises on failure; used in-process and by model_host.
+# Pass a streamer (e.g. CallbackStreamer) to receive decoded text while it is being generated.
+def generate_local(prompt_messages: list, temperature=0.7, streamer=None, use_prefix_cache=KV_PREFIX_CACHE,
+                   max_new_tokens=DEFAULT_MAX_NEW_TOKENS) -> tuple:
     usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    formatted_input = format_local_prompt(prompt_messages)
 
-    # Handle Local LLM
-    if llm_mode == "local" and local_model and local_chatbot_pipeline:
-        try:
-            if hasattr(local_tokenizer, "chat_template") and local_tokenizer.chat_template:
-                formatted_input = local_tokenizer.apply_chat_template(
-                    prompt_messages, tokenize=False, add_generation_prompt=True
-                )
-            else:
-                print("⚠️ chat_template not supported, falling back to raw prompt merge")
-                formatted_input = (
-                    prompt_messages[0]["content"] + "\n\nUser: " + prompt_messages[-1]["content"]
-                )
+    print("🧠 Sending input to local model:")
+    print(formatted_input[:300])
+
+    inputs = local_tokenizer(formatted_input, return_tensors="pt").to(local_model.device)
+    pad_token_id = local_tokenizer.pad_token_id if local_tokenizer.pad_token_id is not None else local_tokenizer.eos_token_id
+    timer = FirstTokenTimer()
+    start = time.time()
+    past_key_values, cached_tokens = prefix_cache.lookup(inputs["input_ids"]) if use_prefix_cache else (None, 0)
+    stopper = ClassBlocksStoppingCriteria(local_tokenizer, inputs["input_ids"].shape[1])
+    with torch.no_grad():
+        output_ids = local_model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            temperature=temperature,
+            top_p=0.95,
+            pad_token_id=pad_token_id,
+            logits_processor=LogitsProcessorList([timer]),
+            stopping_criteria=StoppingCriteriaList([stopper] if EARLY_STOP_CLASS_BLOCKS else []),
+            streamer=streamer,
+            past_key_values=past_key_values,
+        )
+    end = time.time()
+
+    generated = output_ids[0][inputs["input_ids"].shape[1]:]
+    final_response = local_tokenizer.decode(generated, skip_special_tokens=True).strip()
+    if not final_response:
+        raise ValueError("⚠️ Local model returned empty result")
+    print(f"🧠 Local response length: {len(generated)} tokens")
+
+    # Exact counts from the tokenizer that produced the ids
+    usage["model"] = local_model_name
+    usage["prompt_tokens"] = inputs["input_ids"].shape[1]
+    usage["completion_tokens"] = len(generated)
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    add_speed_metrics(usage, start, timer.first_token_at, end, len(generated))
+    usage["cached_prefix_tokens"] = cached_tokens
+    usage["max_new_tokens"] = max_new_tokens
+    usage["stopped_early"] = stopper.stopped()
+    usage["prefill_tokens"] = inputs["input_ids"].shape[1] - cached_tokens
+    print(f"⚡ Prefilled {usage['prefill_tokens']} tokens ({cached_tokens} from prefix cache), first token after {usage['ttft']} sec")
+    return final_response, usage
+
+
+class BatchScheduler:
+    """
+    Groups concurrent local generation requests into one left-padded batched generate().
+    Requests arriving within window_ms of the first queued one (up to max_batch_size, same
+    temperature) share a batch; each caller gets its own response and usage. The batch runs
+    to the largest max_new_tokens and every row stops at its own limit.
+    A batch of one goes through generate_local, so it keeps the restriction-prompt KV cache.
+    """
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, window_ms=BATCH_WINDOW_MS):
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, prompt_messages, temperature=0.7, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, on_text=None):
+        """Block until the request's batch has run; returns (response, usage) like generate_local"""
+        request = {
+            "messages": prompt_messages,
+            "temperature": temperature,
+            "max_new_tokens": max_new_tokens,
+            "on_text": on_text,
+            "submitted_at": time.time(),
+            "done": threading.Event(),
+        }
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._loop, daemon=True)
+                self._worker.start()
+        self._queue.put(request)
+        request["done"].wait()
+        if "error" in request:
+            raise request["error"]
+        return request["response"], request["usage"]
 
-            print("🧠 Sending input to local model:")
-            print(formatted_input[:300])
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            groups = {}
+            for request in batch:
+                groups.setdefault(request["temperature"], []).append(request)
+            for group in groups.values():
+                try:
+                    self._run(group)
+                except Exception as e:
+                    for request in group:
+                        request["error"] = e
+                for request in group:
+                    request["done"].set()
 
-            result = local_chatbot_pipeline(
-                formatted_input,
-                max_new_tokens=512,
+    def _run(self, batch):
+        self.batches += 1
+        self.requests += len(batch)
+        batch_start = time.time()
+        if len(batch) == 1:
+            request = batch[0]
+            streamer = CallbackStreamer(local_tokenizer, request["on_text"]) if request["on_text"] else None
+            request["response"], request["usage"] = generate_local(
+                request["messages"], request["temperature"], streamer=streamer, max_new_tokens=request["max_new_tokens"])
+            request["usage"].update(batch_size=1, queue_ms=round(1000 * (batch_start - request["submitted_at"]), 1))
+            return
+
+        texts = [format_local_prompt(request["messages"]) for request in batch]
+        if local_tokenizer.pad_token is None:
+            local_tokenizer.pad_token = local_tokenizer.eos_token
+        padding_side = local_tokenizer.padding_side
+        local_tokenizer.padding_side = "left"  # generated tokens must directly follow each prompt
+        try:
+            inputs = local_tokenizer(texts, return_tensors="pt", padding=True).to(local_model.device)
+        finally:
+            local_tokenizer.padding_side = padding_side
+
+        eos_token_ids = local_model.generation_config.eos_token_id
+        if eos_token_ids is None:
+            eos_token_ids = local_tokenizer.eos_token_id
+        eos_token_ids = eos_token_ids if isinstance(eos_token_ids, list) else [eos_token_ids]
+        streamer = BatchRowStreamer(local_tokenizer, [request["on_text"] for request in batch], eos_token_ids)
+        limits = [request["max_new_tokens"] for request in batch]
+        stopper = ClassBlocksStoppingCriteria(local_tokenizer, inputs["input_ids"].shape[1])
+        stoppers = [stopper] if EARLY_STOP_CLASS_BLOCKS else []
+        if len(set(limits)) > 1:
+            stoppers.append(RowLengthStoppingCriteria(inputs["input_ids"].shape[1], limits))
+        timer = FirstTokenTimer()
+        print(f"📦 Running a batch of {len(batch)} local generation requests")
+        with torch.no_grad():
+            output_ids = local_model.generate(
+                **inputs,
+                max_new_tokens=max(limits),
                 do_sample=True,
-                temperature=temperature,
-                pad_token_id=getattr(local_tokenizer, "pad_token_id", local_tokenizer.eos_token_id)
+                temperature=batch[0]["temperature"],
+                top_p=0.95,
+                pad_token_id=local_tokenizer.pad_token_id,
+                logits_processor=LogitsProcessorList([timer]),
+                stopping_criteria=StoppingCriteriaList(stoppers),
+                streamer=streamer,
             )
+        end = time.time()
 
-            if not result or not result[0].get("generated_text"):
-                raise ValueError("⚠️ Local model returned empty result")
+        prompt_length = inputs["input_ids"].shape[1]
+        for row, request in enumerate(batch):
+            generated = output_ids[row][prompt_length:prompt_length + request["max_new_tokens"]].tolist()
+            # Rows that finished early are filled with pad tokens up to the longest row
+            stop = next((i for i, token in enumerate(generated) if token in eos_token_ids or token == local_tokenizer.pad_token_id), len(generated))
+            response = local_tokenizer.decode(generated[:stop], skip_special_tokens=True).strip()
+            if not response:
+                request["error"] = ValueError("⚠️ Local model returned empty result")
+                continue
+            usage = {"model": local_model_name, "prompt_tokens": int(inputs["attention_mask"][row].sum()), "completion_tokens": stop}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            add_speed_metrics(usage, request["submitted_at"], timer.first_token_at, end, stop)
+            usage.update(batch_size=len(batch), queue_ms=round(1000 * (batch_start - request["submitted_at"]), 1),
+                         max_new_tokens=request["max_new_tokens"], stopped_early=stopper.stopped(row))
+            request["response"], request["usage"] = response, usage
 
-            final_response = result[0]["generated_text"].replace(formatted_input, "").strip()
-            print(f"🧠 Local response length: {len(final_response.split())} tokens (approx)")
+    def get_stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+batch_scheduler = BatchScheduler()
+
+
+def run_local(prompt_messages: list, temperature=0.7, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, on_text=None) -> tuple:
+    """Local generation entry point: through the batch scheduler when LOCAL_BATCHING is on, else directly"""
+    if LOCAL_BATCHING:
+        return batch_scheduler.submit(prompt_messages, temperature, max_new_tokens=max_new_tokens, on_text=on_text)
+    streamer = CallbackStreamer(local_tokenizer, on_text) if on_text else None
+    return generate_local(prompt_messages, temperature, streamer=streamer, max_new_tokens=max_new_tokens)
+
+
+def stream_local(prompt_messages: list, temperature=0.7, stats=None, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+    """
+    Generator yielding text chunks from the local model as they are decoded.
+    Generation runs in a worker thread; when the stream ends, stats gets "response" and "usage".
+    """
+    chunks = queue.Queue()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["response"], outcome["usage"] = run_local(prompt_messages, temperature, max_new_tokens=max_new_tokens, on_text=chunks.put)
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            chunks.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    for chunk in iter(chunks.get, None):
+        yield chunk
+    if "error" in outcome:
+        raise outcome["error"]
+    if stats is not None:
+        stats.update(outcome)
+
+
+# Throughput of n concurrent requests: one at a time through generate_local vs. the batch scheduler
+def benchmark_batching(n_requests=4, max_new_tokens=64):
+    prompts = [
+        "Generate a TestNG test for the login page.",
+        "Write a Page Object for the donation form.",
+        "Add negative tests for the sign-up email field.",
+        "Verify the search box on the charities page.",
+    ]
+    request_messages = [with_restriction_prompt([{"role": "user", "content": prompts[i % len(prompts)]}]) for i in range(n_requests)]
+    results = {}
+
+    start = time.time()
+    tokens = 0
+    for messages in request_messages:
+        _, usage = generate_local(messages, max_new_tokens=max_new_tokens)
+        tokens += usage["completion_tokens"]
+    results["sequential"] = {"seconds": round(time.time() - start, 2), "completion_tokens": tokens, "completed": n_requests, "failed": 0}
+
+    outcomes = [None] * n_requests
+    errors = [None] * n_requests
+    def call(i):
+        try:
+            outcomes[i] = batch_scheduler.submit(request_messages[i], max_new_tokens=max_new_tokens)
+        except Exception as e:
+            errors[i] = e
+    start = time.time()
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n_requests)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    completed = [outcome for outcome in outcomes if outcome]
+    results["batched"] = {
+        "seconds": round(time.time() - start, 2),
+        "completion_tokens": sum(outcome[1]["completion_tokens"] for outcome in completed),
+        "completed": len(completed),
+        "failed": n_requests - len(completed),
+    }
+    for error in filter(None, errors):
+        print(f"❌ Batched request failed: {error}")
+
+    for mode, r in results.items():
+        # Only completed requests count towards throughput
+        r["requests_per_sec"] = round(r["completed"] / r["seconds"], 3) if r["seconds"] else 0.0
+        print(f"⏱️ {mode}: {r['completed']}/{n_requests} requests in {r['seconds']} sec ({r['requests_per_sec']} req/sec, {r['completion_tokens']} tokens generated)")
+    return results
+
+
+def get_restriction_prompt():
+    """The restriction prompt, re-read when RESTRICTION_PROMPT.txt changes on disk"""
+    global RESTRICTION_PROMPT, restriction_prompt_mtime
+    try:
+        mtime = os.path.getmtime(RESTRICTION_PROMPT_PATH)
+    except OSError:
+        return RESTRICTION_PROMPT
+    if mtime != restriction_prompt_mtime:
+        with open(RESTRICTION_PROMPT_PATH, "r", encoding="utf-8") as file:
+            RESTRICTION_PROMPT = file.read().strip()
+        restriction_prompt_mtime = mtime
+        print("🔄 Restriction prompt changed on disk, reloaded")
+    return RESTRICTION_PROMPT
+
+
+_tokenizers = {}
+
+
+def get_active_model_name():
+    return {"local": local_model_name, "host": host_model_name, "openai": OPENAI_MODEL_NAME}.get(llm_mode)
+
+
+def _get_tokenizer(model_name):
+    """Tokenizer for a local model; only the tokenizer is loaded when the model runs in model_host"""
+    if model_name == local_model_name and local_tokenizer is not None:
+        return local_tokenizer
+    if model_name not in _tokenizers:
+        _tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name)
+    return _tokenizers[model_name]
 
-            # Approximate usage (no official token count from local model)
-            usage["prompt_tokens"] = len(formatted_input.split())
-            usage["completion_tokens"] = len(final_response.split())
-            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
 
+def _openai_encoding():
+    try:
+        return tiktoken.encoding_for_model(OPENAI_MODEL_NAME)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Exact token count of `text` for the active model (chars/4 estimate if no tokenizer is available)"""
+    model_name = get_active_model_name()
+    if llm_mode == "openai":
+        return len(_openai_encoding().encode(text)) if tiktoken else len(text) // 4
+    if model_name:
+        return len(_get_tokenizer(model_name).encode(text, add_special_tokens=False))
+    return len(text) // 4
+
+
+def count_message_tokens(prompt_messages: list) -> int:
+    """Prompt tokens the active model will see for these messages, chat template included"""
+    model_name = get_active_model_name()
+    if llm_mode == "openai":
+        # Per-message framing tokens as documented for the gpt-3.5/4 chat format
+        return sum(4 + count_tokens(m["content"]) for m in prompt_messages) + 3
+    if model_name:
+        tokenizer = _get_tokenizer(model_name)
+        return len(tokenizer(format_local_prompt(prompt_messages, tokenizer))["input_ids"])
+    return sum(len(m["content"]) for m in prompt_messages) // 4
+
+
+def record_telemetry(usage, elapsed_time):
+    """Persist one call's usage to the llm_telemetry store (created on first use)"""
+    global telemetry
+    if not usage.get("completion_tokens"):
+        return
+    try:
+        if telemetry is None:
+            from llm_telemetry import LLMTelemetry
+            telemetry = LLMTelemetry()
+        telemetry.record(llm_mode, usage.get("model") or get_active_model_name(), usage, elapsed_time)
+    except Exception as e:
+        print(f"⚠️ Failed to record LLM telemetry: {e}")
+
+
+def with_restriction_prompt(prompt_messages: list) -> list:
+    return [{"role": "system", "content": get_restriction_prompt()}] + [
+        m for m in prompt_messages if m["role"] != "system"]
+
+
+# Function to handle chat interactions with the LLM
+def chat_with_llm(prompt_messages: list, temperature=0.7, return_usage=False, max_new_tokens=None) -> tuple:
+    start_time = time.time()
+    print(f"🔍 chat_with_llm called with mode: {llm_mode}")
+
+    # Inject restriction prompt only if not already present
+    #if not any(RESTRICTION_PROMPT.strip() in m["content"] for m in prompt_messages if m["role"] == "system"):
+    prompt_messages = with_restriction_prompt(prompt_messages)
+
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+    # Handle Local LLM
+    if llm_mode == "local" and local_model and local_tokenizer:
+        try:
+            final_response, usage = run_local(prompt_messages, temperature, max_new_tokens=max_new_tokens or DEFAULT_MAX_NEW_TOKENS)
         except Exception as e:
             final_response = f"❌ Local model inference failed: {str(e)}"
 
+    # Handle Local LLM served by the model_host process
+    elif llm_mode == "host" and model_host_client:
+        try:
+            final_response, usage = model_host_client.chat(prompt_messages, temperature=temperature,
+                                                           max_new_tokens=max_new_tokens or DEFAULT_MAX_NEW_TOKENS)
+        except Exception as e:
+            final_response = f"❌ Model host call failed: {str(e)}"
+
     # Handle OpenAI LLM
     elif llm_mode == "openai" and openai_client:
         try:
-            response = openai_client.chat.completions.create(
-                model=OPENAI_MODEL_NAME,
-                messages=prompt_messages,
-                temperature=temperature,
-            )
+            # max_new_tokens sizes local replies against a small context window; OpenAI models
+            # get no max_tokens, so their replies are never cut short by a local-model estimate
+            response = openai_client.chat(prompt_messages, model=OPENAI_MODEL_NAME, temperature=temperature)
 
             final_response = response.choices[0].message.content.strip()
 
-            if hasattr(response, "usage"):
+            if getattr(response, "usage", None):
                 usage["prompt_tokens"] = response.usage.prompt_tokens
                 usage["completion_tokens"] = response.usage.completion_tokens
                 usage["total_tokens"] = response.usage.total_tokens
                 print(f"📊 Tokens — Prompt: {usage['prompt_tokens']}, Completion: {usage['completion_tokens']}, Total: {usage['total_tokens']}")
+            else:
+                usage = _count_openai_usage(prompt_messages, final_response)
+            usage["model"] = OPENAI_MODEL_NAME
+            # Without streaming the first token only arrives with the whole response
+            add_speed_metrics(usage, start_time, time.time(), time.time(), 0)
 
         except Exception as e:
             final_response = f"❌ OpenAI call failed: {str(e)}"
@@ -202,6 +1035,7 @@ def chat_with_llm(prompt_messages: list, temperature=0.7, return_usage=False) ->
         final_response = "❌ Selected LLM mode is not available or failed to initialize."
 
     elapsed_time = round(time.time() - start_time, 2)
+    record_telemetry(usage, elapsed_time)
 
     if return_usage:
         return final_response, elapsed_time, usage
@@ -211,8 +1045,91 @@ def chat_with_llm(prompt_messages: list, temperature=0.7, return_usage=False) ->
 
 
 
+# Streaming counterpart of chat_with_llm: yields response text as it is generated so the
+# UI can render it immediately. Once the generator is exhausted, `stats` (if given) holds
+# "response", "elapsed_time" and "usage" (including ttft and tokens_per_sec).
+def stream_chat_with_llm(prompt_messages: list, temperature=0.7, stats=None, max_new_tokens=None):
+    start_time = time.time()
+    print(f"🔍 stream_chat_with_llm called with mode: {llm_mode}")
+    prompt_messages = with_restriction_prompt(prompt_messages)
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    outcome = {}
+    chunks = []
+
+    try:
+        if llm_mode == "local" and local_model and local_tokenizer:
+            stream = stream_local(prompt_messages, temperature, stats=outcome, max_new_tokens=max_new_tokens or DEFAULT_MAX_NEW_TOKENS)
+        elif llm_mode == "host" and model_host_client:
+            stream = model_host_client.chat_stream(prompt_messages, temperature=temperature, stats=outcome,
+                                                   max_new_tokens=max_new_tokens or DEFAULT_MAX_NEW_TOKENS)
+        elif llm_mode == "openai" and openai_client:
+            stream = _stream_openai(prompt_messages, temperature, stats=outcome)
+        else:
+            stream = None
+            chunks.append("❌ Selected LLM mode is not available or failed to initialize.")
+            yield chunks[0]
+
+        for chunk in stream or ():
+            chunks.append(chunk)
+            yield chunk
+        final_response = outcome.get("response", "".join(chunks)).strip()
+        usage = outcome.get("usage", usage)
+    except Exception as e:
+        final_response = f"❌ {llm_mode} streaming call failed: {str(e)}"
+        yield ("\n\n" if chunks else "") + final_response
+
+    elapsed_time = round(time.time() - start_time, 2)
+    record_telemetry(usage, elapsed_time)
+    if usage.get("ttft") is not None:
+        print(f"⚡ First token after {usage['ttft']} sec, {usage.get('tokens_per_sec')} tokens/sec")
+    if stats is not None:
+        stats.update({"response": final_response, "elapsed_time": elapsed_time, "usage": usage})
+
+
+def _stream_openai(prompt_messages, temperature, stats):
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    start = time.time()
+    first_token_at = None
+    chunks = []
+    response = openai_client.stream(prompt_messages, model=OPENAI_MODEL_NAME, temperature=temperature,
+                                    stream_options={"include_usage": True})
+    for chunk in response:
+        if getattr(chunk, "usage", None):
+            usage["prompt_tokens"] = chunk.usage.prompt_tokens
+            usage["completion_tokens"] = chunk.usage.completion_tokens
+            usage["total_tokens"] = chunk.usage.total_tokens
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first_token_at is None:
+                first_token_at = time.time()
+            chunks.append(chunk.choices[0].delta.content)
+            yield chunks[-1]
+    if not usage["completion_tokens"]:
+        # Endpoints that ignore stream_options (e.g. a local stub server) send no usage chunk
+        usage = _count_openai_usage(prompt_messages, "".join(chunks))
+    usage["model"] = OPENAI_MODEL_NAME
+    stats["usage"] = add_speed_metrics(usage, start, first_token_at, time.time(), usage["completion_tokens"])
+
+
+def _count_openai_usage(prompt_messages, response_text):
+    usage = {"prompt_tokens": count_message_tokens(prompt_messages), "completion_tokens": count_tokens(response_text)}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return usage
+
+
+# Run several independent chats at once, e.g. one per queued module. OpenAI calls fan out
+# through the shared async client (bounded by OPENAI_MAX_CONCURRENCY); local calls are
+# submitted together so the batch scheduler can group them. Returns chat_with_llm results in order.
+def chat_many_with_llm(prompt_message_lists: list, temperature=0.7, max_new_tokens=None) -> list:
+    from concurrent.futures import ThreadPoolExecutor
+    workers = OPENAI_MAX_CONCURRENCY if llm_mode == "openai" else BATCH_MAX_SIZE
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(prompt_message_lists)))) as pool:
+        return list(pool.map(lambda messages: chat_with_llm(messages, temperature, return_usage=True, max_new_tokens=max_new_tokens), prompt_message_lists))
+
+
 # Use RAG-enhanced chat for test case generation
 def simple_chat_prompt(user_prompt: str) -> tuple[str, float]:
+    # Imported here so loading this module (e.g. in model_host) doesn't load the RAG index
+    from rag_search import retrieve_context
     context = retrieve_context(user_prompt)
     return chat_with_llm([
         {
@@ -225,4 +1142,29 @@ def simple_chat_prompt(user_prompt: str) -> tuple[str, float]:
             )
         },
         {"role": "user", "content": user_prompt}
-    ])
\ No newline at end of file
+    ])
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local model precision benchmark")
+    parser.add_argument("--benchmark", metavar="MODEL", nargs="?", const="TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+                        help="compare tokens/sec and peak RSS across precision modes")
+    parser.add_argument("--prefix-benchmark", metavar="MODEL", nargs="?", const="TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+                        help="compare prefill time with and without the restriction-prompt KV cache")
+    parser.add_argument("--batch-benchmark", metavar="MODEL", nargs="?", const="TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+                        help="compare throughput of concurrent requests, one at a time vs. batched")
+    parser.add_argument("--measure", nargs=3, metavar=("MODEL", "PRECISION", "TOKENS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        _measure_precision(args.measure[0], args.measure[1], int(args.measure[2]))
+    elif args.benchmark:
+        benchmark_precision_modes(args.benchmark)
+    elif args.batch_benchmark:
+        if initialize_local_model(args.batch_benchmark):
+            benchmark_batching()
+    elif args.prefix_benchmark:
+        if initialize_local_model(args.prefix_benchmark):
+            benchmark_prefix_cache()
+    else:
+        parser.print_help()
@@ -0,0 +1,99 @@
+#llm_telemetry.py
+import os
+import threading
+import time
+
+from tinydb import TinyDB, Query
+
+# This file keeps one record per LLM call (model, exact token counts, prefill/decode time and
+# an estimated cost) so models can be compared on p50/p95 latency and tokens/sec over time.
+
+# USD per 1K tokens (input, output); local models are free to run
+MODEL_PRICING = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+}
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    return round(prompt_tokens / 1000 * input_price + completion_tokens / 1000 * output_price, 6)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class LLMTelemetry:
+    def __init__(self, db_path='cache/llm_telemetry.json'):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = TinyDB(db_path)
+        self.query = Query()
+        self._lock = threading.Lock()
+
+    def record(self, mode, model, usage, elapsed):
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        entry = {
+            "timestamp": time.time(),
+            "mode": mode,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": usage.get("total_tokens", prompt_tokens + completion_tokens),
+            "cached_prefix_tokens": usage.get("cached_prefix_tokens", 0),
+            "prefill_seconds": usage.get("ttft"),
+            "decode_seconds": usage.get("decode_seconds"),
+            "elapsed_seconds": elapsed,
+            "tokens_per_sec": usage.get("tokens_per_sec"),
+            "batch_size": usage.get("batch_size", 1),
+            "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens),
+        }
+        with self._lock:
+            self.db.insert(entry)
+        return entry
+
+    def get_records(self, model=None, since=None):
+        records = self.db.all()
+        if model:
+            records = [r for r in records if r["model"] == model]
+        if since:
+            records = [r for r in records if r["timestamp"] >= since]
+        return records
+
+    def summary(self, since=None):
+        """Per-model call count, p50/p95 latency, p50 prefill, mean tokens/sec, tokens and cost"""
+        by_model = {}
+        for r in self.get_records(since=since):
+            by_model.setdefault(r["model"], []).append(r)
+
+        summary = {}
+        for model, records in by_model.items():
+            latencies = [r["elapsed_seconds"] for r in records if r["elapsed_seconds"] is not None]
+            prefills = [r["prefill_seconds"] for r in records if r["prefill_seconds"] is not None]
+            speeds = [r["tokens_per_sec"] for r in records if r["tokens_per_sec"]]
+            summary[model] = {
+                "calls": len(records),
+                "p50_latency": _percentile(latencies, 50),
+                "p95_latency": _percentile(latencies, 95),
+                "p50_prefill": _percentile(prefills, 50),
+                "avg_tokens_per_sec": round(sum(speeds) / len(speeds), 2) if speeds else None,
+                "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+                "completion_tokens": sum(r["completion_tokens"] for r in records),
+                "cost_usd": round(sum(r["cost_usd"] for r in records), 4),
+            }
+        return summary
+
+    def clear(self):
+        self.db.truncate()
+        return "✅ LLM telemetry cleared."
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(LLMTelemetry().summary(), indent=2))
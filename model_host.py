@@ -0,0 +1,235 @@
+# model_host.py
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+
+from config import MODEL_HOST_ADDRESS, MODEL_HOST_AUTHKEY, MODEL_HOST_KEY_PATH, MODEL_HOST_LOAD_TIMEOUT, LOCAL_PRECISION
+
+# Long-lived local inference host. It loads the selected local model once and serves
+# chat requests from every Streamlit session over a local socket, so neither new
+# sessions nor UI restarts re-pay the model load.
+#
+# Start it manually with:  python model_host.py
+# (ModelHostClient.ensure_running() also starts it on demand.)
+
+LOG_PATH = "cache/model_host.log"
+
+
+def get_authkey(key_path=MODEL_HOST_KEY_PATH):
+    """
+    Shared secret for host and clients: MODEL_HOST_AUTHKEY if set, else a random key created
+    once per install (readable only by this user). Both sides call this, whoever runs first creates it.
+    """
+    if MODEL_HOST_AUTHKEY:
+        return MODEL_HOST_AUTHKEY.encode()
+    if not os.path.isabs(key_path):
+        key_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), key_path)
+    if not os.path.exists(key_path):
+        os.makedirs(os.path.dirname(key_path), exist_ok=True)
+        tmp_path = f"{key_path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, key_path)  # atomic create-if-missing, so concurrent starters agree on one key
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(key_path) as f:
+        return f.read().strip().encode()
+
+
+class ModelHost:
+    def __init__(self):
+        self.model_name = None
+        self.precision = None
+        self.model_stats = {}
+        self.state = "idle"
+        self.error = None
+        self.load_seconds = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def status(self):
+        if self.state == "ready":
+            import llm_engine
+            self.model_stats = llm_engine.get_local_model_stats()
+        return {
+            "state": self.state,
+            "model": self.model_name,
+            "precision": self.precision,
+            "model_stats": self.model_stats,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "pid": os.getpid(),
+        }
+
+    def load(self, model_name, precision=LOCAL_PRECISION):
+        """Start loading `model_name` in the background; no-op if it is already loaded or loading"""
+        with self._lock:
+            if (model_name, precision) == (self.model_name, self.precision) and self.state in ("loading", "ready"):
+                return
+            self.model_name = model_name
+            self.precision = precision
+            self.model_stats = {}
+            self.state = "loading"
+            self.error = None
+            self._ready.clear()
+        threading.Thread(target=self._load, args=(model_name, precision), daemon=True).start()
+
+    def _load(self, model_name, precision):
+        import llm_engine
+        start = time.time()
+        # Load into the registry only; activating here would let a slow, superseded load
+        # swap itself in after a newer model already reported ready
+        try:
+            entry, error = llm_engine.model_registry.get(model_name, precision), None
+        except Exception as e:
+            entry, error = None, f"Failed to load {model_name}: {e}"
+        with self._lock:
+            if (model_name, precision) != (self.model_name, self.precision):
+                print(f"⏭️ Load of {model_name} ({precision}) finished after a newer request, keeping it cached only")
+                return
+            self.load_seconds = round(time.time() - start, 2)
+            if entry is not None:
+                llm_engine.activate_local_model(model_name, precision, entry, switch_seconds=self.load_seconds)
+            self.model_stats = llm_engine.get_local_model_stats() if entry is not None else {}
+            self.state = "ready" if entry is not None else "failed"
+            self.error = error
+            self._ready.set()
+
+    def _wait_ready(self):
+        if not self._ready.wait(timeout=MODEL_HOST_LOAD_TIMEOUT):
+            raise TimeoutError(f"Model {self.model_name} is still loading")
+        if self.state != "ready":
+            raise RuntimeError(self.error or "No model loaded")
+
+    def chat(self, messages, temperature, max_new_tokens=None):
+        import llm_engine
+        self._wait_ready()
+        start = time.time()
+        response, usage = llm_engine.run_local(messages, temperature, max_new_tokens=max_new_tokens or llm_engine.DEFAULT_MAX_NEW_TOKENS)
+        return {"response": response, "usage": usage, "elapsed": round(time.time() - start, 2)}
+
+    def chat_stream(self, conn, messages, temperature, max_new_tokens=None):
+        """Send {"token": ...} messages as text is generated, then a final {"done": True, ...} reply"""
+        import llm_engine
+        self._wait_ready()
+        start = time.time()
+        outcome = {}
+        for chunk in llm_engine.stream_local(messages, temperature, stats=outcome,
+                                             max_new_tokens=max_new_tokens or llm_engine.DEFAULT_MAX_NEW_TOKENS):
+            conn.send({"token": chunk})
+        return {"done": True, "response": outcome["response"], "usage": outcome["usage"], "elapsed": round(time.time() - start, 2)}
+
+    def handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    op = request.get("op")
+                    if op == "status":
+                        reply = self.status()
+                    elif op == "load":
+                        self.load(request["model"], request.get("precision", LOCAL_PRECISION))
+                        reply = self.status()
+                    elif op == "chat":
+                        reply = self.chat(request["messages"], request.get("temperature", 0.7), request.get("max_new_tokens"))
+                    elif op == "chat_stream":
+                        reply = self.chat_stream(conn, request["messages"], request.get("temperature", 0.7), request.get("max_new_tokens"))
+                    else:
+                        reply = {"error": f"Unknown op: {op}"}
+                except Exception as e:
+                    reply = {"error": str(e)}
+                conn.send(reply)
+
+    def serve(self, address=MODEL_HOST_ADDRESS):
+        with Listener(address, authkey=get_authkey()) as listener:
+            print(f"🧠 Model host listening on {address[0]}:{address[1]} (pid {os.getpid()})")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+
+class ModelHostClient:
+    """Thin client used by llm_engine when llm_mode == "host" """
+    def __init__(self, address=MODEL_HOST_ADDRESS, authkey=None):
+        self.address = address
+        self.authkey = authkey or get_authkey()
+
+    def _request(self, message):
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send(message)
+            reply = conn.recv()
+        if isinstance(reply, dict) and reply.get("error") and "state" not in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def is_running(self):
+        try:
+            self._request({"op": "status"})
+            return True
+        except (ConnectionRefusedError, FileNotFoundError, OSError):
+            return False
+
+    def ensure_running(self, wait=30):
+        """Spawn the host as a detached process if nothing is listening yet"""
+        if self.is_running():
+            return
+        os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+        here = os.path.dirname(os.path.abspath(__file__))
+        with open(LOG_PATH, "a") as log:
+            subprocess.Popen(
+                [sys.executable, os.path.join(here, "model_host.py")],
+                cwd=here,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            if self.is_running():
+                print("🚀 Model host started.")
+                return
+            time.sleep(0.5)
+        raise TimeoutError(f"Model host did not start within {wait} sec (see {LOG_PATH})")
+
+    def status(self):
+        return self._request({"op": "status"})
+
+    def load_model(self, model_name, precision=LOCAL_PRECISION):
+        return self._request({"op": "load", "model": model_name, "precision": precision})
+
+    def chat(self, messages, temperature=0.7, max_new_tokens=None):
+        reply = self._request({"op": "chat", "messages": messages, "temperature": temperature, "max_new_tokens": max_new_tokens})
+        return reply["response"], reply["usage"]
+
+    def chat_stream(self, messages, temperature=0.7, stats=None, max_new_tokens=None):
+        """Yield text chunks from the host; `stats` receives "response" and "usage" at the end"""
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send({"op": "chat_stream", "messages": messages, "temperature": temperature, "max_new_tokens": max_new_tokens})
+            while True:
+                reply = conn.recv()
+                if "token" in reply:
+                    yield reply["token"]
+                    continue
+                if reply.get("error"):
+                    raise RuntimeError(reply["error"])
+                if stats is not None:
+                    stats.update(response=reply["response"], usage=reply["usage"])
+                return
+
+
+if __name__ == "__main__":
+    host = ModelHost()
+    if len(sys.argv) > 1:
+        host.load(*sys.argv[1:3])
+    host.serve()
@@ -0,0 +1,152 @@
+# openai_client.py
+import asyncio
+import queue
+import random
+import threading
+
+import openai
+
+from config import OPENAI_BASE_URL, OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, OPENAI_MAX_RETRIES
+
+# One AsyncOpenAI client running on a private event-loop thread and shared by every
+# Streamlit session. Sync callers (llm_engine) submit coroutines to that loop, so all
+# calls reuse one pooled HTTP connection set, respect one concurrency limit and retry
+# 429/5xx/timeouts with exponential backoff and full jitter.
+#
+# Point OPENAI_BASE_URL at openai_stub_server.py to exercise it without the real API.
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APITimeoutError, openai.APIConnectionError)
+
+
+class AsyncOpenAIPool:
+    def __init__(self, api_key, base_url=OPENAI_BASE_URL, max_concurrency=OPENAI_MAX_CONCURRENCY,
+                 timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES, backoff_base=0.5, backoff_max=20.0):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {"calls": 0, "retries": 0, "failures": 0}
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True, name="openai-loop").start()
+        self._run(self._setup(api_key, base_url, max_concurrency))
+
+    async def _setup(self, api_key, base_url, max_concurrency):
+        # Created on the loop thread so the semaphore and the client's keep-alive pool belong to this loop
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=self.timeout,
+            max_retries=0,  # retries are handled below so they share the backoff policy and stats
+        )
+
+    def _run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def _retry_delay(self, attempt, error):
+        """Full-jitter exponential backoff, but never sooner than the server's Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        try:
+            retry_after = float(response.headers.get("retry-after")) if response is not None else 0.0
+        except (TypeError, ValueError):
+            retry_after = 0.0
+        return max(delay, retry_after)
+
+    async def acreate(self, hold_slot=False, **kwargs):
+        """
+        chat.completions.create with the concurrency limit, per-call timeout and retries applied.
+        With hold_slot=True the concurrency slot stays taken after a successful call and the
+        caller must release self.semaphore (streams hold it until their body has been read).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.semaphore.acquire()
+                try:
+                    response = await self.client.chat.completions.create(**kwargs)
+                except BaseException:
+                    self.semaphore.release()
+                    raise
+                if not hold_slot:
+                    self.semaphore.release()
+                return response
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._retry_delay(attempt, e)
+                self.stats["retries"] += 1
+                print(f"⚠️ OpenAI {type(e).__name__}, retry {attempt + 1}/{self.max_retries} in {delay:.1f} sec")
+                await asyncio.sleep(delay)
+
+    def chat(self, messages, model, temperature=0.7, **kwargs):
+        return self._run(self.acreate(model=model, messages=messages, temperature=temperature, **kwargs))
+
+    def chat_many(self, message_lists, model, temperature=0.7, **kwargs):
+        """Fan out one call per message list; returns responses (or the raised exceptions) in input order"""
+        async def fan_out():
+            return await asyncio.gather(
+                *(self.acreate(model=model, messages=messages, temperature=temperature, **kwargs) for messages in message_lists),
+                return_exceptions=True,
+            )
+        return self._run(fan_out())
+
+    def stream(self, messages, model, temperature=0.7, **kwargs):
+        """
+        Sync iterator over streamed chunks. Retries cover opening the stream; an error after
+        chunks have started arriving is raised to the caller.
+        """
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                stream = await self.acreate(model=model, messages=messages, temperature=temperature, stream=True, hold_slot=True, **kwargs)
+                try:
+                    async for chunk in stream:
+                        chunks.put(chunk)
+                finally:
+                    self.semaphore.release()
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    def close(self):
+        self._run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+if __name__ == "__main__":
+    # Smoke test: fan out a few requests, e.g. against `python openai_stub_server.py --fail-rate 0.3`
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="Fan out chat requests through AsyncOpenAIPool")
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    args = parser.parse_args()
+
+    pool = AsyncOpenAIPool(api_key=os.getenv("OPENAI_API_KEY") or "stub-key")
+    start = time.time()
+    results = pool.chat_many([[{"role": "user", "content": f"Request {i}"}] for i in range(args.requests)], model=args.model)
+    failed = [r for r in results if isinstance(r, Exception)]
+    print(f"✅ {len(results) - len(failed)}/{len(results)} succeeded in {time.time() - start:.2f} sec, stats: {pool.get_stats()}")
+    for error in failed:
+        print(f"❌ {type(error).__name__}: {error}")
+    pool.close()
@@ -0,0 +1,108 @@
+# openai_stub_server.py
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal stand-in for the OpenAI chat completions endpoint, for exercising
+# openai_client.AsyncOpenAIPool (retries, timeouts, concurrency) without the real API:
+#
+#   python openai_stub_server.py --port 8089 --fail-rate 0.3 --latency 0.5
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub python openai_client.py
+
+STUB_REPLY = (
+    "=== PAGE OBJECT CLASS: StubPage ===\n```java\npublic class StubPage {\n}\n```\n\n"
+    "=== TEST OBJECT CLASS: StubTest ===\n```java\npublic class StubTest {\n}\n```"
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (e.g. its per-call timeout fired)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+
+        roll = random.random()
+        if roll < self.fail_rate / 2:
+            self._send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "requests"}}, {"Retry-After": "0.2"})
+            return
+        if roll < self.fail_rate:
+            self._send_json(503, {"error": {"message": "Service unavailable (stub)", "type": "server_error"}})
+            return
+
+        model = request.get("model", "gpt-3.5-turbo")
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in request.get("messages", []))
+        completion_tokens = len(STUB_REPLY.split())
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for piece in STUB_REPLY.split(" "):
+                self._send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                                  "choices": [{"index": 0, "delta": {"content": piece + " "}, "finish_reason": None}]})
+            self._send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                              "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if request.get("stream_options", {}).get("include_usage"):
+                self._send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                                  "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": STUB_REPLY}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+
+def serve(port=8089, fail_rate=0.0, latency=0.0):
+    StubHandler.fail_rate = fail_rate
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    print(f"🧪 OpenAI stub listening on http://127.0.0.1:{port}/v1 (fail rate {fail_rate}, latency {latency}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429/503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+    serve(args.port, args.fail_rate, args.latency)
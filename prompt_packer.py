@@ -0,0 +1,126 @@
+# prompt_packer.py
+import re
+
+from config import MODEL_CONTEXT_LIMITS, DEFAULT_CONTEXT_LIMIT, PROMPT_TOKEN_BUDGET
+from dom_scraper import to_compact_findby_line
+from element_ranker import FORM_CONTROL_TYPES, STOPWORDS, default_scorer, tokenize
+from llm_engine import DEFAULT_MAX_NEW_TOKENS, estimate_max_new_tokens, count_tokens, count_message_tokens, with_restriction_prompt
+
+# Builds the single user message sent to the LLM: instructions, the DOM in compact
+# "field_name | by=selector" form (once), help-doc lines and the request, trimmed to the
+# active model's context window. chat_with_llm drops other system messages, so everything
+# the model needs goes into this one message.
+
+UUID_RE = re.compile(r"^[\da-f]{8}-[\da-f]{4}-[\da-f]{4}-[\da-f]{4}-[\da-f]{12}$")
+
+
+def get_context_limit(model_name):
+    return MODEL_CONTEXT_LIMITS.get(model_name, DEFAULT_CONTEXT_LIMIT)
+
+
+def get_prompt_budget(model_name, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+    """Prompt tokens available: PROMPT_TOKEN_BUDGET if set, else the context window minus the reply"""
+    if PROMPT_TOKEN_BUDGET:
+        return PROMPT_TOKEN_BUDGET
+    return get_context_limit(model_name) - max_new_tokens
+
+
+def fit_max_new_tokens(model_name, prompt_tokens, desired):
+    """Reply budget clamped to what the context window has left after a packed prompt of prompt_tokens"""
+    return max(1, min(desired, get_context_limit(model_name) - prompt_tokens))
+
+
+def estimate_reply_tokens(n_elements):
+    """Reply budget for a prompt with n_elements DOM elements, never below DEFAULT_MAX_NEW_TOKENS"""
+    return max(DEFAULT_MAX_NEW_TOKENS, estimate_max_new_tokens(n_elements))
+
+
+def dom_line(el):
+    line = to_compact_findby_line(el)
+    selector = el.get("selector", "")
+    if el.get("by") == "id" and (selector.isdigit() or UUID_RE.match(selector)):
+        line += "  (unstable auto-generated id)"
+    return line
+
+
+def _render(url, prompt, dom_lines, rag_lines):
+    parts = []
+    if dom_lines:
+        parts.append(
+            f"Use *only* the following DOM elements extracted from {url}.\n"
+            "Each line is in the format: field_name | strategy=selector\n"
+            "Do NOT invent new selectors or field names.\n\n" + "\n".join(dom_lines)
+        )
+    else:
+        parts.append(f"No DOM elements could be extracted from {url}, so you may have to make assumptions.")
+    if rag_lines:
+        parts.append("Relevant help documentation:\n" + "\n".join(rag_lines))
+    parts.append(
+        "Generate a Java Page Object class using Selenium + TestNG + Maven. "
+        "Use @FindBy annotations and the PageFactory pattern.\n\n"
+        f"Task: {prompt}"
+    )
+    return "\n\n".join(parts)
+
+
+def _element_priority(el, prompt_tokens):
+    """Form controls outrank everything; the rest by the element_ranker relevance score"""
+    return (el.get("type") in FORM_CONTROL_TYPES, default_scorer(el, prompt_tokens))
+
+
+def pack_prompt(prompt, url, dom_elements, rag_lines=(), budget=None, model_name=None, reply_tokens=None):
+    """
+    Return (user_message_content, report). Help-doc lines are dropped first (last line first),
+    then DOM elements from lowest priority up, until the prompt (with the restriction prompt
+    and chat template that chat_with_llm adds) fits in `budget` tokens. When reply_tokens
+    (number of DOM elements kept -> reply tokens) is given instead, the budget is the
+    context window minus the reply estimated for the elements still kept, so trimming stops
+    once the prompt and its estimated reply both fit.
+    """
+    def current_budget():
+        if reply_tokens is not None:
+            return get_prompt_budget(model_name, reply_tokens(len(kept)))
+        return budget if budget is not None else get_prompt_budget(model_name)
+
+    rag_lines = [line for line in rag_lines if line.strip()]
+    prompt_tokens = tokenize(prompt) - STOPWORDS
+    lines = [dom_line(el) for el in dom_elements]
+    # Indices of droppable elements, lowest priority first (ties: later on the page first)
+    drop_order = sorted(range(len(dom_elements)), key=lambda i: (_element_priority(dom_elements[i], prompt_tokens), -i))
+    kept = set(range(len(dom_elements)))
+    rag_kept = len(rag_lines)
+
+    def measure():
+        content = _render(url, prompt, [lines[i] for i in sorted(kept)], rag_lines[:rag_kept])
+        return content, count_message_tokens(with_restriction_prompt([{"role": "user", "content": content}]))
+
+    content, total = measure()
+    budget = current_budget()
+    # Trim using per-line estimates, then confirm with an exact count of the whole message
+    while total > budget and (rag_kept or kept):
+        excess = total - budget
+        while excess > 0 and rag_kept:
+            rag_kept -= 1
+            excess -= count_tokens(rag_lines[rag_kept]) + 1
+        for i in drop_order:
+            if excess <= 0:
+                break
+            if i in kept:
+                kept.remove(i)
+                excess -= count_tokens(lines[i]) + 1
+        content, total = measure()
+        budget = current_budget()
+
+    dropped = [dom_elements[i] for i in range(len(dom_elements)) if i not in kept]
+    report = {
+        "budget": budget,
+        "tokens": total,
+        "over_budget": total > budget,
+        "dom_kept": len(kept),
+        "dom_dropped": [el.get("name", "") for el in dropped],
+        "dropped_form_controls": sum(el.get("type") in FORM_CONTROL_TYPES for el in dropped),
+        "rag_lines_kept": rag_kept,
+        "rag_lines_dropped": len(rag_lines) - rag_kept,
+    }
+    print(f"📐 Packed prompt: {total}/{budget} tokens, dropped {len(dropped)} elements and {report['rag_lines_dropped']} help lines")
+    return content, report
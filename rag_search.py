@@ -1,20 +1,107 @@
 #rag_search.py
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings  # ✅ Best practice as of LangChain v0.2.2+
+import threading
+import time
+
 from langchain.schema import Document
 
-# ✅ Initialize embeddings using HuggingFace model
-embedding = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+from config import RAG_RELOAD_CHECK_SECONDS, RAG_EMBEDDING_MODEL
+from index_registry import index_registry
+
+# The embedding model and FAISS index load lazily on the first retrieval, so importing this
+# module (app.py, code_generator, llm_engine) costs nothing. Every RAG_RELOAD_CHECK_SECONDS the
+# handle re-reads index_registry's CURRENT pointer and swaps in a newly published (or
+# rolled back) version without an app restart. Published versions are never modified in
+# place, so a load always reads one consistent version.
+
+LEGACY_INDEX_DIR = "rag_index"
+
+
+def find_latest_index():
+    """Directory of the current published version, or a pre-versioning rag_index/ if none was published"""
+    path = index_registry.current_path()
+    if path:
+        return path
+    return LEGACY_INDEX_DIR if os.path.exists(os.path.join(LEGACY_INDEX_DIR, "index.faiss")) else None
+
+
+def _index_signature(path):
+    """Changes whenever CURRENT points at another version (or the legacy index is rewritten)"""
+    try:
+        return path, os.path.getmtime(os.path.join(path, "index.faiss")), os.path.getmtime(os.path.join(path, "index.pkl"))
+    except OSError:
+        return None
+
+
+class RAGIndexHandle:
+    """
+    Thread-safe, lazily loaded FAISS retriever. Searches use whatever index is current when
+    they start; a reload builds the new FAISS store off to the side and then swaps the
+    reference, so in-flight searches are never interrupted.
+    """
+    def __init__(self, locate=find_latest_index, check_interval=RAG_RELOAD_CHECK_SECONDS):
+        self.locate = locate
+        self.check_interval = check_interval
+        self._embedding = None
+        self._db = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "searches": 0, "last_load_seconds": None, "index_path": None}
+
+    def _get_embedding(self):
+        if self._embedding is None:
+            from langchain_huggingface import HuggingFaceEmbeddings  # ✅ Best practice as of LangChain v0.2.2+
+            print(f"🔎 Loading embedding model: {RAG_EMBEDDING_MODEL}")
+            self._embedding = HuggingFaceEmbeddings(model_name=RAG_EMBEDDING_MODEL)
+        return self._embedding
+
+    def get_db(self):
+        """Current FAISS store (loading or reloading it if needed), or None if nothing was ingested yet"""
+        if self._db is not None and time.time() - self._checked_at < self.check_interval:
+            return self._db
+        with self._lock:
+            if self._db is not None and time.time() - self._checked_at < self.check_interval:
+                return self._db  # another thread just checked
+            self._checked_at = time.time()
+            path = self.locate()
+            signature = _index_signature(path) if path else None
+            if signature is None:
+                if self._db is None:
+                    print("⚠️ No FAISS index found. Please ingest a PDF or help URL first.")
+                return self._db  # keep serving the last good index
+            if signature != self._signature:
+                self._load(path, signature)
+            return self._db
+
+    def _load(self, path, signature):
+        from langchain_community.vectorstores import FAISS
+        start = time.time()
+        try:
+            db = FAISS.load_local(path, self._get_embedding(), allow_dangerous_deserialization=True)
+        except Exception as e:
+            print(f"❌ Failed to load FAISS index from {path}: {e}")
+            return
+        self._db, self._signature = db, signature
+        self.stats.update(loads=self.stats["loads"] + 1, last_load_seconds=round(time.time() - start, 2), index_path=path)
+        print(f"📚 {'Reloaded' if self.stats['loads'] > 1 else 'Loaded'} FAISS index from {path} in {self.stats['last_load_seconds']} sec")
+
+    def reload(self):
+        """Force a check for a new index on the next search"""
+        self._checked_at = 0.0
+
+    def get_stats(self):
+        return dict(self.stats, loaded=self._db is not None)
+
 
-# ✅ Load FAISS index (ensure index exists)
-index_path = "rag_index/index.faiss"
-if not os.path.exists(index_path):
-    raise RuntimeError(f"❌ FAISS index not found at {index_path}. Please ingest a PDF or help URL first.")
+rag_index = RAGIndexHandle()
 
-db = FAISS.load_local("rag_index", embedding, allow_dangerous_deserialization=True)
 
 # ✅ Function to retrieve top-k similar documents
 def retrieve_context(query: str, k: int = 3) -> str:
+    db = rag_index.get_db()
+    if db is None:
+        return ""
+    rag_index.stats["searches"] += 1
     results: list[Document] = db.similarity_search(query, k=k)
     return "\n\n".join([r.page_content for r in results])
@@ -0,0 +1,125 @@
+#session_store.py
+import os
+import time
+from urllib.parse import urlparse
+
+import requests
+from tinydb import TinyDB, Query
+from selenium.common.exceptions import WebDriverException
+
+from config import SESSION_MAX_AGE, get_env_for_url
+
+# This file stores authenticated browser sessions per environment as plain JSON with
+# expiry metadata, replacing the old cookies.pkl pickle (which we never want to unpickle).
+class SessionStore:
+    def __init__(self, db_path='cache/sessions.json', max_age=SESSION_MAX_AGE, probe_timeout=5):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = TinyDB(db_path)
+        self.max_age = max_age
+        self.probe_timeout = probe_timeout
+        self.query = Query()
+
+    def save(self, url, cookies):
+        env = get_env_for_url(url)
+        parsed = urlparse(url)
+        now = time.time()
+        expiries = [c["expiry"] for c in cookies if c.get("expiry")]
+        self.db.upsert({
+            "env": env,
+            "origin": f"{parsed.scheme}://{parsed.netloc}",
+            "saved_at": now,
+            # Session cookies carry no expiry, so cap the whole session at max_age. Cookies that
+            # die within minutes (analytics throttles) are ignored; load() drops them when expired.
+            "expires_at": min([now + self.max_age] + [e for e in expiries if e > now + 600]),
+            "cookies": [self._clean(c) for c in cookies],
+        }, self.query.env == env)
+        print(f"✅ Saved {len(cookies)} cookies for environment '{env}'")
+
+    @staticmethod
+    def _clean(cookie):
+        allowed = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expiry")
+        return {k: v for k, v in cookie.items() if k in allowed}
+
+    def load(self, url):
+        """Return the stored session for the URL's environment with already-expired cookies dropped"""
+        entry = self.db.get(self.query.env == get_env_for_url(url))
+        if not entry:
+            return None
+        now = time.time()
+        entry = dict(entry)
+        entry["cookies"] = [c for c in entry["cookies"] if not c.get("expiry") or c["expiry"] > now]
+        return entry
+
+    def is_valid(self, url, probe_url=None):
+        """
+        Cheap validity check without a browser: the session must not be past its expiry and,
+        when probe_url is given, an authenticated GET must not bounce back to a login page.
+        """
+        entry = self.load(url)
+        if not entry or not entry["cookies"]:
+            return False
+        if time.time() >= entry["expires_at"]:
+            print(f"⌛ Saved session for '{entry['env']}' has expired")
+            return False
+        if probe_url:
+            jar = {c["name"]: c["value"] for c in entry["cookies"]}
+            try:
+                response = requests.get(probe_url, cookies=jar, timeout=self.probe_timeout, allow_redirects=True)
+            except Exception as e:
+                print(f"⚠️ Session probe failed for {probe_url}: {e}")
+                return False
+            if response.status_code in (401, 403) or "login" in response.url.lower():
+                print(f"🔐 Saved session for '{entry['env']}' was rejected by {probe_url}")
+                self.invalidate(url)
+                return False
+        return True
+
+    def invalidate(self, url):
+        self.db.remove(self.query.env == get_env_for_url(url))
+
+    def inject(self, driver, url):
+        """Put the stored cookies into the browser before the first navigation to `url`"""
+        entry = self.load(url)
+        if not entry or not entry["cookies"]:
+            print("⚠️ No saved session found.")
+            return 0
+        set_browser_cookies(driver, entry["cookies"], entry["origin"])
+        print(f"✅ {len(entry['cookies'])} cookies loaded for '{entry['env']}'")
+        return len(entry["cookies"])
+
+
+def set_browser_cookies(driver, cookies, origin):
+    """
+    Install cookies in one CDP Network.setCookies call on Chrome, so no page has to be
+    loaded first. Other browsers fall back to opening `origin` and calling add_cookie.
+    """
+    if hasattr(driver, "execute_cdp_cmd"):
+        params = []
+        for c in cookies:
+            param = {
+                "name": c["name"],
+                "value": c["value"],
+                "domain": c.get("domain") or urlparse(origin).netloc,
+                "path": c.get("path", "/"),
+                "secure": c.get("secure", False),
+                "httpOnly": c.get("httpOnly", False),
+            }
+            if c.get("sameSite") in ("Strict", "Lax", "None"):
+                param["sameSite"] = c["sameSite"]
+            if c.get("expiry"):
+                param["expires"] = c["expiry"]
+            params.append(param)
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
+        return
+    driver.get(origin)
+    for c in cookies:
+        try:
+            driver.add_cookie({k: v for k, v in c.items() if k != "sameSite"})
+        except WebDriverException as e:
+            print(f"⚠️ Skipped cookie {c.get('name')}: {e}")
+
+# Usage:
+# store = SessionStore()
+# if store.is_valid(url, probe_url=dashboard_url):
+#     store.inject(driver, url)
+#     driver.get(url)
@@ -0,0 +1,281 @@
+# static_scraper.py
+import os
+import re
+import shutil
+import time
+from urllib.parse import urlparse
+
+import requests
+from lxml import html as lxml_html
+
+from dom_scraper import (
+    INTERACTIVE_ELEMENTS_XPATH,
+    REGION_BY_ROLE,
+    REGION_BY_TAG,
+    SelectorIndex,
+    build_element_metadata,
+    choose_raw_name,
+    dedupe_element_names,
+    extract_page_elements,
+)
+
+# Browserless extractor for pages that don't need JS hydration. It parses the served
+# HTML with lxml and produces the same element dicts as dom_scraper.extract_element_metadata.
+
+HIDDEN_STYLE_PATTERN = re.compile(r"(display\s*:\s*none|visibility\s*:\s*(hidden|collapse)|opacity\s*:\s*0(\.0*)?\s*(;|$))", re.IGNORECASE)
+
+
+def _is_hidden(el):
+    """Static approximation of Selenium's is_displayed: hidden inputs, hidden attributes and inline styles"""
+    if el.tag == "input" and (el.get("type") or "").lower() == "hidden":
+        return True
+    node = el
+    while node is not None:
+        if node.get("hidden") is not None:
+            return True
+        if HIDDEN_STYLE_PATTERN.search(node.get("style") or ""):
+            return True
+        node = node.getparent()
+    return False
+
+
+def _is_disabled(el):
+    if el.tag not in ("input", "textarea", "select", "button"):
+        return False
+    if el.get("disabled") is not None:
+        return True
+    return any(fs.get("disabled") is not None for fs in el.iterancestors("fieldset"))
+
+
+def _region(el):
+    for node in el.iterancestors():
+        if not isinstance(node.tag, str):
+            continue
+        region = REGION_BY_ROLE.get((node.get("role") or "").lower()) or REGION_BY_TAG.get(node.tag.lower())
+        if region:
+            return region
+    return ""
+
+
+def _text(el):
+    return " ".join(el.text_content().split())
+
+
+def build_static_selector_index(tree):
+    """SelectorIndex over a parsed document, matching dom_scraper.SELECTOR_INDEX_SCRIPT counts"""
+    counts = {"id": {}, "class": {}, "name": {}}
+    for el in tree.iter():
+        if not isinstance(el.tag, str):
+            continue
+        if el.get("id"):
+            counts["id"][el.get("id")] = counts["id"].get(el.get("id"), 0) + 1
+        if el.get("name"):
+            counts["name"][el.get("name")] = counts["name"].get(el.get("name"), 0) + 1
+        for cls in set((el.get("class") or "").split()):
+            counts["class"][cls] = counts["class"].get(cls, 0) + 1
+    return SelectorIndex(counts)
+
+
+def absolute_xpath(el, first_by_id):
+    """Port of the absoluteXPath JS helper: anchor on a unique id, otherwise tag[position] segments"""
+    segments = []
+    node = el
+    while node is not None and isinstance(node.tag, str):
+        node_id = node.get("id")
+        if node_id and first_by_id.get(node_id) is node:
+            segments.append(f'id("{node_id}")')
+            return "/".join(reversed(segments))
+        position = 1 + sum(1 for sib in node.itersiblings(preceding=True) if sib.tag == node.tag)
+        segments.append(f"{node.tag.lower()}[{position}]")
+        node = node.getparent()
+    segments.append("")
+    return "/".join(reversed(segments))
+
+
+def scrape_static_html(page_html):
+    """Extract element metadata from raw HTML without a browser"""
+    tree = lxml_html.document_fromstring(page_html)
+    index = build_static_selector_index(tree)
+
+    labels_for = {}
+    for label in tree.iter("label"):
+        labels_for.setdefault(label.get("for") or "", _text(label))
+
+    first_by_id = {}
+    for el in tree.iter():
+        if isinstance(el.tag, str) and el.get("id"):
+            first_by_id.setdefault(el.get("id"), el)
+
+    metas = []
+    for el in tree.xpath(INTERACTIVE_ELEMENTS_XPATH):
+        if _is_hidden(el) or _is_disabled(el):
+            metas.append(None)
+            continue
+        attrs = {name: el.get(name) or "" for name in ("data-testid", "data-cy", "name", "id", "placeholder", "aria-label", "class")}
+        tag = el.tag.lower()
+        input_type = (el.get("type") or "text").lower() if tag == "input" else (el.get("type") or "")
+        raw_name = choose_raw_name(attrs, labels_for.get(attrs["id"], ""))
+        by, selector = index.resolve(attrs["id"], attrs["class"], attrs["name"])
+        if not selector:
+            by, selector = "xpath", absolute_xpath(el, first_by_id)
+        metas.append(build_element_metadata(tag, input_type, raw_name, by, selector, _region(el)))
+    return dedupe_element_names(metas)
+
+
+class StaticRedirectError(Exception):
+    """The server answered with a different page than the one requested (login, SSO or bot check)"""
+
+
+def _same_page(requested_url, final_url):
+    requested, final = urlparse(requested_url), urlparse(final_url)
+    return requested.netloc == final.netloc and requested.path.rstrip("/") == final.path.rstrip("/")
+
+
+def suggest_validations_static(url, cookies=None, timeout=15):
+    """
+    Fetch a page over plain HTTP and extract its elements with lxml.
+    Raises StaticRedirectError when the response is not the requested page, so the caller
+    can fall back to Selenium instead of generating locators for a login or challenge page.
+    """
+    jar = {c["name"]: c["value"] for c in cookies or []}
+    start = time.time()
+    response = requests.get(url, cookies=jar, timeout=timeout)
+    response.raise_for_status()
+    if not _same_page(url, response.url):
+        hops = " -> ".join(r.headers.get("Location", "?") for r in response.history)
+        raise StaticRedirectError(f"{url} was served as {response.url}" + (f" (redirects: {hops})" if hops else ""))
+    results = scrape_static_html(response.text)
+    print(f"📄 Static scrape of {url}: {len(results)} elements in {round(time.time() - start, 2)} sec")
+    return results
+
+
+# Local fixture pages for check_parity, one per behaviour the two extractors must agree on
+PARITY_FIXTURES = {
+    "labels": """<html><body><form>
+<label for="email">Email address</label><input id="email" type="email">
+<label for="pw">Password</label><input id="pw" name="password" type="password">
+<input placeholder="Search the site" type="search">
+<input aria-label="Promo code" type="text">
+<textarea data-testid="comment-box"></textarea>
+<select data-cy="country"><option>Canada</option></select>
+<button type="submit">Sign in</button>
+</form></body></html>""",
+    "hidden_disabled": """<html><body><form>
+<input type="hidden" name="csrf" value="x">
+<input name="hidden_attr" hidden>
+<div style="display: none"><input name="in_hidden_div"></div>
+<input name="invisible" style="visibility:hidden">
+<input name="transparent" style="opacity: 0;">
+<input name="visible_field">
+<input name="disabled_field" disabled>
+<fieldset disabled><input name="in_disabled_fieldset"><button>Inside fieldset</button></fieldset>
+<button disabled>Disabled button</button>
+<button>Enabled button</button>
+</form></body></html>""",
+    "duplicates": """<html><body>
+<input id="dup" name="first">
+<input id="dup" name="second">
+<button class="btn">One</button><button class="btn">Two</button>
+<button class="btn unique-combo">Three</button>
+<button class="solo">Four</button>
+<button class="md:flex w-1/2">Tailwind</button>
+<a href="#a" class="nav-link">Home</a><a href="#b" class="nav-link">Home</a>
+<input name="shared" type="radio"><input name="shared" type="radio">
+</body></html>""",
+    "regions": """<html><body>
+<header><a href="/" class="logo">Home</a></header>
+<nav><a href="/docs">Docs</a></nav>
+<div role="navigation"><a href="/blog">Blog</a></div>
+<main><form><input name="q"><button>Go</button></form></main>
+<aside><button class="tip">Tip</button></aside>
+<div role="dialog"><button class="close">Close</button></div>
+<div role="contentinfo"><a href="/terms">Terms</a></div>
+<footer><a href="/privacy">Privacy</a></footer>
+<button class="orphan">No region</button>
+</body></html>""",
+}
+
+
+def write_parity_fixtures(directory):
+    """Write PARITY_FIXTURES plus dom_scraper's generated benchmark page into `directory`; returns the paths"""
+    from dom_scraper import _build_benchmark_fixture
+    paths = []
+    for name, page_html in PARITY_FIXTURES.items():
+        path = os.path.join(directory, f"{name}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(page_html)
+        paths.append(path)
+    generated = _build_benchmark_fixture(60)
+    paths.append(shutil.move(generated, os.path.join(directory, "generated_form.html")))
+    return paths
+
+
+def check_parity(html_paths, driver):
+    """
+    Compare the lxml extractor with the Selenium bulk path on local fixture pages.
+    Returns {path: list of (index, static, selenium) mismatches}; an empty list means parity.
+    """
+    report = {}
+    for path in html_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            static_results = scrape_static_html(f.read())
+        driver.get(f"file://{path}")
+        browser_results = extract_page_elements(driver)
+        mismatches = [
+            (i, s, b) for i, (s, b) in enumerate(zip(static_results, browser_results)) if s != b
+        ]
+        if len(static_results) != len(browser_results):
+            mismatches.append((None, len(static_results), len(browser_results)))
+        report[path] = mismatches
+        print(f"{'✅' if not mismatches else '❌'} Parity for {path}: {len(mismatches)} mismatch(es)")
+    return report
+
+
+def check_live_parity(urls, driver, cookies=None):
+    """
+    Compare the static scrape of each live URL with the hydrated Selenium scrape of the same URL.
+    This is the check a page must pass before it is marked "static" in app.PAGE_SCRAPE_MODES:
+    a server-rendered shell that lacks some controls only shows up here.
+    """
+    from dom_scraper import apply_session_cookies, suggest_validations
+    report = {}
+    for url in urls:
+        try:
+            static_results = suggest_validations_static(url, cookies=cookies)
+        except Exception as e:
+            report[url] = [(None, f"static scrape failed: {e}", None)]
+            print(f"❌ Live parity for {url}: {e}")
+            continue
+        if cookies:
+            apply_session_cookies(driver, url, cookies)
+        browser_results = suggest_validations(url, driver=driver)
+        mismatches = [
+            (i, s, b) for i, (s, b) in enumerate(zip(static_results, browser_results)) if s != b
+        ]
+        if len(static_results) != len(browser_results):
+            mismatches.append((None, len(static_results), len(browser_results)))
+        report[url] = mismatches
+        print(f"{'✅' if not mismatches else '❌'} Live parity for {url}: {len(mismatches)} mismatch(es)")
+    return report
+
+
+# Check parity against Selenium on the bundled fixture pages, on your own HTML files, or on
+# live pages (cookies come from the saved session for that site):
+# python static_scraper.py
+# python static_scraper.py page1.html page2.html
+# python static_scraper.py https://example.org/campaigns/some-campaign
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from driver_pool import get_driver_pool
+    from session_store import SessionStore
+    urls = [a for a in sys.argv[1:] if a.startswith(("http://", "https://"))]
+    with tempfile.TemporaryDirectory(prefix="static_parity_") as fixture_dir:
+        files = [os.path.abspath(a) for a in sys.argv[1:] if a not in urls]
+        paths = files or ([] if urls else write_parity_fixtures(fixture_dir))
+        with get_driver_pool().lease() as parity_driver:
+            report = check_parity(paths, parity_driver)
+            if urls:
+                session = SessionStore().load(urls[0])
+                report.update(check_live_parity(urls, parity_driver, cookies=session["cookies"] if session else None))
+    sys.exit(1 if any(report.values()) else 0)